@@ -1,9 +1,12 @@
-from flask import Flask, send_from_directory
+from flask import Flask, abort, redirect, request, send_from_directory
 from flask_cors import CORS
+import click
 import os
 from dotenv import load_dotenv
-from database import initialize_db
+from database import db, initialize_db, rollup, Report
 from backend.routes import reports_bp, stats_bp, reviews_bp
+from backend.services.storage import storage
+from backend.services.derivatives import derivative_service, pick_width, derivative_name, can_render, WIDTHS, FORMATS
 
 load_dotenv()
 
@@ -11,17 +14,112 @@ app = Flask(__name__, static_folder='../frontend', static_url_path='')
 app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY')
 CORS(app)
 
+# A derivative that is still being rendered is stood in for by the original, briefly
+PENDING_MAX_AGE = 60
+# Upload names are random and never reused, so every variant can be cached for a year
+UPLOADS_MAX_AGE = 365 * 24 * 3600
+
 app.register_blueprint(reports_bp)
 app.register_blueprint(stats_bp)
 app.register_blueprint(reviews_bp)
 
+@app.before_request
+def open_db_connection():
+    db.connect(reuse_if_open=True)
+
+@app.teardown_request
+def close_db_connection(exc):
+    if not db.is_closed():
+        db.close()
+
 @app.route('/')
 def index():
     return send_from_directory(app.static_folder, 'index.html')
 
+def send_upload(key):
+    url = storage.url(key)
+    if url:
+        return redirect(url)
+    
+    response = send_from_directory(storage.root, key, max_age=UPLOADS_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory('../uploads', filename)
+    width = request.args.get('w', type=int)
+    if not width:
+        return send_upload(filename)
+    
+    if not can_render(filename):
+        abort(404)
+    
+    width = pick_width(width)
+    ext = 'webp' if request.accept_mimetypes['image/webp'] else 'jpg'
+    key = derivative_name(filename, width, ext)
+    try:
+        ready, original = storage.exists(key), storage.exists(filename)
+    except FileNotFoundError:
+        abort(404)
+    
+    if ready:
+        response = send_upload(key)
+    elif original:
+        # Derivatives are made on ingest; older uploads get theirs queued, never rendered in the request
+        derivative_service.request(filename)
+        response = send_upload(filename)
+        response.cache_control.immutable = False
+        response.cache_control.max_age = PENDING_MAX_AGE
+    else:
+        abort(404)
+    
+    response.vary.add('Accept')
+    return response
+
+@app.cli.command('rebuild-stats')
+@click.option('--check', is_flag=True, help='Only compare the rollup with the reports table.')
+def rebuild_stats(check):
+    initialize_db()
+    mismatches = rollup.verify_rollup() if check else rollup.rebuild_rollup()
+    for key, expected, actual in mismatches:
+        click.echo(f"{key}: expected {expected}, stored {actual}")
+    if mismatches:
+        raise click.ClickException(f"{len(mismatches)} rollup buckets do not match")
+    click.echo("Report stats rollup is consistent")
+
+@app.cli.command('migrate-uploads')
+@click.option('--source', default=os.path.join(app.root_path, '..', 'uploads'), help='Directory with the flat legacy uploads.')
+@click.option('--keep', is_flag=True, help='Leave the legacy files in place after copying.')
+def migrate_uploads(source, keep):
+    initialize_db()
+    migrated = missing = 0
+    
+    # Legacy photo_path values are bare "<uuid>.jpg" names; content keys always contain a shard directory
+    legacy = Report.select(Report.id, Report.photo_path).where(~Report.photo_path.contains('/'))
+    for report in legacy.iterator():
+        path = os.path.join(source, report.photo_path)
+        if not os.path.exists(path):
+            missing += 1
+            click.echo(f"Report #{report.id}: {report.photo_path} not found")
+            continue
+        
+        with open(path, 'rb') as file:
+            data = file.read()
+        key = storage.save(data)
+        derivative_service.generate(key, data)
+        Report.update(photo_path=key).where(Report.id == report.id).execute()
+        migrated += 1
+        
+        if not keep:
+            os.remove(path)
+            for width in WIDTHS:
+                for ext in FORMATS:
+                    try:
+                        os.remove(os.path.join(source, derivative_name(report.photo_path, width, ext)))
+                    except FileNotFoundError:
+                        pass
+    
+    click.echo(f"Migrated {migrated} uploads, {missing} missing")
 
 if __name__ == '__main__':
     initialize_db()
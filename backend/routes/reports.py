@@ -1,75 +1,281 @@
-from flask import Blueprint, request, jsonify
-from database import db, Report, User, ReportHistory
+from flask import Blueprint, Response, request, jsonify
+from database import db, rollup, Report, User, ReportHistory
+from database.leaderboard import leaderboard
+from database.spatial import report_grid, CLOSED_STATUSES
+from database.clusters import report_clusters, MAX_ZOOM
+from .stats import invalidate_stats
 from datetime import datetime
+import base64
+import gzip
+import hashlib
+import json
+import os
+import re
 
 reports_bp = Blueprint('reports', __name__)
 
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+NEARBY_RADIUS = int(os.getenv('REPORT_DEDUP_RADIUS', 50))
+MAX_NEARBY_RADIUS = 1000
+JSONP_CALLBACK = re.compile(r'^[\w.$]+$')
+# Bot-internal values, returned only when asked for via ?fields=
+PRIVATE_FIELDS = ('telegram_file_id',)
+
+def encode_cursor(report):
+    raw = f"{report.created_at.isoformat()}|{report.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    created_at, report_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+    return datetime.fromisoformat(created_at), int(report_id)
+
+def parse_list(value):
+    return [v for v in value.split(',') if v] if value else []
+
+def parse_bbox(args):
+    if args.get('bbox'):
+        values = args['bbox'].split(',')
+    else:
+        values = [args.get(k) for k in ('min_lat', 'min_lon', 'max_lat', 'max_lon')]
+        if not any(values):
+            return None
+    if len(values) != 4 or not all(values):
+        raise ValueError('bbox requires min_lat,min_lon,max_lat,max_lon')
+    return [float(v) for v in values]
+
+def serialize_report(report, fields=None):
+    data = {
+        'id': report.id,
+        'user_id': report.user.telegram_id,
+        'username': report.user.username,
+        'photo_path': report.photo_path,
+        'telegram_file_id': report.telegram_file_id,
+        'latitude': report.latitude,
+        'longitude': report.longitude,
+        'address': report.address,
+        'description': report.description,
+        'waste_type': report.waste_type,
+        'danger_level': report.danger_level,
+        'status': report.status,
+        'created_at': report.created_at.isoformat(),
+        'updated_at': report.updated_at.isoformat()
+    }
+    if fields:
+        return {key: value for key, value in data.items() if key in fields}
+    for key in PRIVATE_FIELDS:
+        del data[key]
+    return data
+
+def anchor_position(report_id):
+    anchor = Report.select(Report.created_at, Report.id).where(Report.id == report_id).first()
+    return (anchor.created_at, anchor.id) if anchor else None
+
 @reports_bp.route('/api/reports', methods=['GET'])
 def get_reports():
-    status = request.args.get('status')
+    statuses = parse_list(request.args.get('status'))
+    # ?status!=resolved arrives as the key "status!"
+    excluded = parse_list(request.args.get('status!')) + parse_list(request.args.get('exclude_status'))
     waste_type = request.args.get('waste_type')
     danger_level = request.args.get('danger_level')
+    cursor = request.args.get('cursor')
+    after_id = request.args.get('after_id', type=int)
+    before_id = request.args.get('before_id', type=int)
     
-    query = Report.select()
+    try:
+        bbox = parse_bbox(request.args)
+        limit = request.args.get('limit', type=int)
+        if cursor or limit or after_id or before_id:
+            limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # after_id/before_id anchor a page on a known row, which keeps bot callback_data short
+    before = None
+    if after_id or before_id:
+        anchor = anchor_position(after_id or before_id)
+        if anchor is None:
+            # The anchor row is gone; only a cursor sent alongside it can still place the page
+            if not after:
+                return jsonify({'error': 'Anchor report not found'}), 410
+        elif after_id:
+            after = anchor
+        else:
+            before = anchor
     
-    if status:
-        query = query.where(Report.status == status)
+    query = Report.select(Report, User).join(User)
+    
+    if statuses:
+        query = query.where(Report.status.in_(statuses))
+    if excluded:
+        query = query.where(Report.status.not_in(excluded))
     if waste_type:
         query = query.where(Report.waste_type == waste_type)
     if danger_level:
         query = query.where(Report.danger_level == danger_level)
+    if bbox:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        query = query.where(
+            Report.latitude.between(min_lat, max_lat) &
+            Report.longitude.between(min_lon, max_lon)
+        )
+    
+    total = None
+    if request.args.get('with_total'):
+        if waste_type or danger_level or bbox:
+            total = query.count()
+        else:
+            total = rollup.count_reports(statuses, excluded)
+    
+    if after:
+        created_at, report_id = after
+        query = query.where(
+            (Report.created_at < created_at) |
+            ((Report.created_at == created_at) & (Report.id < report_id))
+        )
+    if before:
+        created_at, report_id = before
+        query = query.where(
+            (Report.created_at > created_at) |
+            ((Report.created_at == created_at) & (Report.id > report_id))
+        )
+        query = query.order_by(Report.created_at.asc(), Report.id.asc())
+    else:
+        query = query.order_by(Report.created_at.desc(), Report.id.desc())
+    if limit:
+        query = query.limit(limit + 1)
+    
+    rows = list(query)
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        if not before:
+            next_cursor = encode_cursor(rows[-1])
+    if before:
+        rows.reverse()
+    
+    fields = parse_list(request.args.get('fields'))
+    reports = [serialize_report(report, fields) for report in rows]
+    
+    response = jsonify(reports)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    if total is not None:
+        response.headers['X-Total-Count'] = str(total)
+    return response
+
+@reports_bp.route('/api/reports/nearby', methods=['GET'])
+def get_nearby_reports():
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+    if latitude is None or longitude is None:
+        return jsonify({'error': 'lat and lon are required'}), 400
+    radius = max(1, min(request.args.get('radius', NEARBY_RADIUS, type=int), MAX_NEARBY_RADIUS))
+    limit = max(1, min(request.args.get('limit', 5, type=int), 50))
+    
+    found = report_grid.nearby(latitude, longitude, radius, limit)
+    if not found:
+        return jsonify([])
     
-    reports = []
-    for report in query.order_by(Report.created_at.desc()):
-        reports.append({
+    reports = {
+        report.id: report
+        for report in Report.select(
+            Report.id, Report.latitude, Report.longitude, Report.status, Report.waste_type, Report.address
+        ).where(Report.id.in_([report_id for _, report_id in found]))
+    }
+    
+    result = []
+    for distance, report_id in found:
+        report = reports.get(report_id)
+        if report is None:
+            continue
+        result.append({
             'id': report.id,
-            'user_id': report.user.telegram_id,
-            'username': report.user.username,
-            'photo_path': report.photo_path,
+            'distance': round(distance, 1),
             'latitude': report.latitude,
             'longitude': report.longitude,
             'address': report.address,
-            'description': report.description,
             'waste_type': report.waste_type,
-            'danger_level': report.danger_level,
-            'status': report.status,
-            'created_at': report.created_at.isoformat(),
-            'updated_at': report.updated_at.isoformat()
+            'status': report.status
         })
+    return jsonify(result)
+
+@reports_bp.route('/api/reports/clusters', methods=['GET'])
+def get_report_clusters():
+    try:
+        bbox = parse_bbox(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    zoom = max(0, min(request.args.get('z', 10, type=int), MAX_ZOOM))
+    filters = (
+        tuple(sorted(parse_list(request.args.get('status')))),
+        request.args.get('waste_type'),
+        request.args.get('danger_level')
+    )
     
-    return jsonify(reports)
+    collection = {
+        'type': 'FeatureCollection',
+        'features': report_clusters.features(zoom, bbox, filters)
+    }
+    
+    # RemoteObjectManager fetches tiles over JSONP and passes the callback name in %c
+    callback = request.args.get('callback')
+    if callback:
+        if not JSONP_CALLBACK.match(callback):
+            return jsonify({'error': 'Invalid callback'}), 400
+        payload = json.dumps({'error': None, 'data': collection}, ensure_ascii=False)
+        return Response(f"{callback}({payload});", mimetype='application/javascript')
+    return jsonify(collection)
+
+@reports_bp.route('/api/reports/points', methods=['GET'])
+def get_report_points():
+    try:
+        bbox = parse_bbox(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    filters = (
+        tuple(sorted(parse_list(request.args.get('status')))),
+        request.args.get('waste_type'),
+        request.args.get('danger_level')
+    )
+    
+    body = json.dumps(report_clusters.columns(bbox, filters), separators=(',', ':')).encode()
+    gzipped = 'gzip' in request.headers.get('Accept-Encoding', '')
+    etag = hashlib.sha1(body).hexdigest()
+    response = Response(body, mimetype='application/json')
+    # The gzip and identity bodies differ byte for byte, so each gets its own strong ETag
+    response.set_etag(f"{etag}-gzip" if gzipped else etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    response.make_conditional(request)
+    
+    if response.status_code == 200 and gzipped:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
 
 @reports_bp.route('/api/reports/<int:report_id>', methods=['GET'])
 def get_report(report_id):
     try:
-        report = Report.get_by_id(report_id)
+        report = Report.select(Report, User).join(User).where(Report.id == report_id).get()
         
-        history = []
-        for h in report.history.order_by(ReportHistory.created_at.desc()):
-            history.append({
-                'old_status': h.old_status,
-                'new_status': h.new_status,
-                'changed_by': h.changed_by,
-                'comment': h.comment,
-                'created_at': h.created_at.isoformat()
-            })
+        fields = parse_list(request.args.get('fields'))
+        data = serialize_report(report, fields)
         
-        return jsonify({
-            'id': report.id,
-            'user_id': report.user.telegram_id,
-            'username': report.user.username,
-            'photo_path': report.photo_path,
-            'latitude': report.latitude,
-            'longitude': report.longitude,
-            'address': report.address,
-            'description': report.description,
-            'waste_type': report.waste_type,
-            'danger_level': report.danger_level,
-            'status': report.status,
-            'created_at': report.created_at.isoformat(),
-            'updated_at': report.updated_at.isoformat(),
-            'history': history
-        })
+        if not fields or 'history' in fields:
+            data['history'] = []
+            for h in report.history.order_by(ReportHistory.created_at.desc()):
+                data['history'].append({
+                    'old_status': h.old_status,
+                    'new_status': h.new_status,
+                    'changed_by': h.changed_by,
+                    'comment': h.comment,
+                    'created_at': h.created_at.isoformat()
+                })
+        
+        return jsonify(data)
     except:
         return jsonify({'error': 'Report not found'}), 404
 
@@ -86,22 +292,29 @@ def create_report():
             first_name=data.get('first_name')
         )
     
-    report = Report.create(
-        user=user,
-        photo_path=data['photo_path'],
-        latitude=data['latitude'],
-        longitude=data['longitude'],
-        address=data.get('address'),
-        description=data['description'],
-        waste_type=data['waste_type'],
-        danger_level=data['danger_level']
-    )
-    
     rating_points = data.get('rating_points', 10)
     
-    user.reports_count += 1
-    user.rating += rating_points
-    user.save()
+    with db.atomic():
+        report = Report.create(
+            user=user,
+            photo_path=data['photo_path'],
+            telegram_file_id=data.get('telegram_file_id'),
+            latitude=data['latitude'],
+            longitude=data['longitude'],
+            address=data.get('address'),
+            description=data['description'],
+            waste_type=data['waste_type'],
+            danger_level=data['danger_level']
+        )
+        rollup.add_report(report)
+        
+        user.reports_count += 1
+        user.rating += rating_points
+        user.save()
+    leaderboard.update(user)
+    report_grid.update(report)
+    report_clusters.invalidate()
+    invalidate_stats()
     
     return jsonify({
         'id': report.id,
@@ -117,27 +330,71 @@ def update_report(report_id):
         report = Report.get_by_id(report_id)
         old_status = report.status
         
-        report.status = data['status']
-        report.updated_at = datetime.now()
-        report.save()
-        
-        ReportHistory.create(
-            report=report,
-            old_status=old_status,
-            new_status=data['status'],
-            changed_by=data['changed_by'],
-            comment=data.get('comment')
-        )
+        with db.atomic():
+            report.status = data['status']
+            report.updated_at = datetime.now()
+            report.save()
+            
+            rollup.remove_report(report, status=old_status)
+            rollup.add_report(report)
+            
+            ReportHistory.create(
+                report=report,
+                old_status=old_status,
+                new_status=data['status'],
+                changed_by=data['changed_by'],
+                comment=data.get('comment')
+            )
+        report_grid.update(report)
+        report_clusters.invalidate()
+        invalidate_stats()
         
         return jsonify({'status': 'updated'})
     except:
         return jsonify({'error': 'Report not found'}), 404
 
+@reports_bp.route('/api/reports/<int:report_id>/photo', methods=['PUT'])
+def update_report_photo(report_id):
+    data = request.json
+    
+    updated = Report.update(telegram_file_id=data.get('telegram_file_id')).where(Report.id == report_id).execute()
+    if not updated:
+        return jsonify({'error': 'Report not found'}), 404
+    return jsonify({'status': 'updated'})
+
+@reports_bp.route('/api/reports/<int:report_id>/attach', methods=['POST'])
+def attach_to_report(report_id):
+    data = request.get_json(silent=True) or {}
+    if not data.get('user_id'):
+        return jsonify({'error': 'user_id is required'}), 400
+    
+    report = Report.get_or_none(Report.id == report_id)
+    if report is None or report.status in CLOSED_STATUSES:
+        return jsonify({'error': 'Report not found'}), 404
+    
+    # A repeat sighting is kept as history on the open report instead of a new row
+    with db.atomic():
+        ReportHistory.create(
+            report=report,
+            old_status=report.status,
+            new_status=report.status,
+            changed_by=data['user_id'],
+            comment=f"Повторное сообщение, фото: {data['photo_path']}" if data.get('photo_path') else "Повторное сообщение"
+        )
+        Report.update(updated_at=datetime.now()).where(Report.id == report_id).execute()
+    
+    return jsonify({'id': report.id, 'status': 'attached'}), 201
+
 @reports_bp.route('/api/reports/<int:report_id>', methods=['DELETE'])
 def delete_report(report_id):
     try:
         report = Report.get_by_id(report_id)
-        report.delete_instance()
+        with db.atomic():
+            rollup.remove_report(report)
+            report.delete_instance(recursive=True)
+        report_grid.remove(report_id)
+        report_clusters.invalidate()
+        invalidate_stats()
         return jsonify({'status': 'deleted'})
     except:
         return jsonify({'error': 'Report not found'}), 404
@@ -1,13 +1,12 @@
 from flask import Blueprint, jsonify, request
-from database import Review, User, db
+from database import Review, User
 
 reviews_bp = Blueprint('reviews', __name__)
 
 
 @reviews_bp.route('/api/reviews', methods=['GET'])
 def get_reviews():
-    db.connect(reuse_if_open=True)
-    reviews = Review.select().where(Review.is_approved == True).order_by(Review.created_at.desc())
+    reviews = Review.select(Review, User).join(User).where(Review.is_approved == True).order_by(Review.created_at.desc())
 
     reviews_list = []
     for review in reviews:
@@ -21,7 +20,6 @@ def get_reviews():
             'created_at': review.created_at.isoformat()
         })
 
-    db.close()
     return jsonify(reviews_list)
 
 
@@ -29,7 +27,6 @@ def get_reviews():
 def create_review():
     data = request.json
 
-    db.connect(reuse_if_open=True)
     try:
         user = User.get(User.telegram_id == data['user_id'])
     except:
@@ -45,14 +42,11 @@ def create_review():
         rating=data.get('rating', 5)
     )
 
-    db.close()
     return jsonify({'id': review.id, 'status': 'created'}), 201
 
 
 @reviews_bp.route('/api/reviews/<int:review_id>', methods=['DELETE'])
 def delete_review(review_id):
-    db.connect(reuse_if_open=True)
     review = Review.get_by_id(review_id)
     review.delete_instance()
-    db.close()
     return jsonify({'status': 'deleted'})
\ No newline at end of file
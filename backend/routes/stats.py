@@ -1,61 +1,67 @@
-from flask import Blueprint, jsonify
-from database import Report, User
-from peewee import fn
+from flask import Blueprint, jsonify, request
+from database import User, ReportStats, UserReportStats
+from database.leaderboard import leaderboard
+import os
+import time
 
 stats_bp = Blueprint('stats', __name__)
 
-@stats_bp.route('/api/stats', methods=['GET'])
-def get_stats():
-    total_reports = Report.select().count()
-    total_users = User.select().count()
-    
-    reports_by_status = {}
-    for status in ['new', 'reviewing', 'in_progress', 'resolved', 'rejected']:
-        count = Report.select().where(Report.status == status).count()
-        reports_by_status[status] = count
+STATUSES = ['new', 'reviewing', 'in_progress', 'resolved', 'rejected']
+STATS_CACHE_TTL = int(os.getenv('STATS_CACHE_TTL', 60))
+
+_stats_cache = {'payload': None, 'expires_at': 0}
+
+def invalidate_stats():
+    _stats_cache['payload'] = None
+
+def aggregate_reports():
+    query = ReportStats.select(
+        ReportStats.status, ReportStats.waste_type, ReportStats.danger_level, ReportStats.count
+    ).where(ReportStats.count != 0).tuples()
     
+    total_reports = 0
+    reports_by_status = {status: 0 for status in STATUSES}
     reports_by_type = {}
-    types_query = Report.select(Report.waste_type, fn.COUNT(Report.id).alias('count')).group_by(Report.waste_type)
-    for report in types_query:
-        reports_by_type[report.waste_type] = report.count
-    
     reports_by_danger = {}
-    danger_query = Report.select(Report.danger_level, fn.COUNT(Report.id).alias('count')).group_by(Report.danger_level)
-    for report in danger_query:
-        reports_by_danger[report.danger_level] = report.count
+    for status, waste_type, danger_level, count in query:
+        total_reports += count
+        reports_by_status[status] = reports_by_status.get(status, 0) + count
+        reports_by_type[waste_type] = reports_by_type.get(waste_type, 0) + count
+        reports_by_danger[danger_level] = reports_by_danger.get(danger_level, 0) + count
     
-    top_users = []
-    for user in User.select().order_by(User.rating.desc()).limit(10):
-        top_users.append({
-            'telegram_id': user.telegram_id,
-            'username': user.username,
-            'reports_count': user.reports_count,
-            'rating': user.rating
-        })
+    return total_reports, reports_by_status, reports_by_type, reports_by_danger
+
+def build_stats():
+    total_reports, reports_by_status, reports_by_type, reports_by_danger = aggregate_reports()
     
-    return jsonify({
+    return {
         'total_reports': total_reports,
-        'total_users': total_users,
+        'total_users': User.select().count(),
         'reports_by_status': reports_by_status,
         'reports_by_type': reports_by_type,
         'reports_by_danger': reports_by_danger,
-        'top_users': top_users
-    })
+        'top_users': leaderboard.top(10)
+    }
+
+@stats_bp.route('/api/stats', methods=['GET'])
+def get_stats():
+    # The bot creates users from its own process, so the TTL bounds how stale total_users can get
+    if _stats_cache['payload'] is None or time.monotonic() >= _stats_cache['expires_at']:
+        _stats_cache['payload'] = build_stats()
+        _stats_cache['expires_at'] = time.monotonic() + STATS_CACHE_TTL
+    
+    return jsonify(_stats_cache['payload'])
 
 @stats_bp.route('/api/user/<int:telegram_id>/stats', methods=['GET'])
 def get_user_stats(telegram_id):
     try:
         user = User.get(User.telegram_id == telegram_id)
         
-        reports_by_status = {}
-        for status in ['new', 'reviewing', 'in_progress', 'resolved', 'rejected']:
-            count = Report.select().where(
-                (Report.user == user) & (Report.status == status)
-            ).count()
-            reports_by_status[status] = count
+        reports_by_status = {status: 0 for status in STATUSES}
+        for row in UserReportStats.select().where(UserReportStats.user == user):
+            reports_by_status[row.status] = reports_by_status.get(row.status, 0) + row.count
         
-        rank_query = User.select(fn.COUNT(User.id).alias('rank')).where(User.rating > user.rating)
-        rank = rank_query.scalar() + 1
+        rank = leaderboard.rank(user.rating)
         
         return jsonify({
             'telegram_id': user.telegram_id,
@@ -67,3 +73,21 @@ def get_user_stats(telegram_id):
         })
     except:
         return jsonify({'error': 'User not found'}), 404
+
+@stats_bp.route('/api/leaderboard', methods=['GET'])
+def get_leaderboard():
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    return jsonify(leaderboard.top(limit))
+
+@stats_bp.route('/api/user/<int:telegram_id>/leaderboard', methods=['GET'])
+def get_user_leaderboard(telegram_id):
+    try:
+        user = User.get(User.telegram_id == telegram_id)
+    except User.DoesNotExist:
+        return jsonify({'error': 'User not found'}), 404
+    
+    radius = max(0, min(request.args.get('radius', 2, type=int), 25))
+    return jsonify({
+        'rank': leaderboard.rank(user.rating),
+        'users': leaderboard.around(user, radius)
+    })
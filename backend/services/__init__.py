@@ -1,3 +1,12 @@
-from .gigachat import gigachat_service
+from .storage import storage
+from .derivatives import derivative_service
 
-__all__ = ['gigachat_service']
+__all__ = ['gigachat_service', 'storage', 'derivative_service']
+
+
+def __getattr__(name):
+    # The GigaChat client is only needed by the bot, so the web app never builds it
+    if name == 'gigachat_service':
+        from .gigachat import gigachat_service
+        return gigachat_service
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
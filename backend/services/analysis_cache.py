@@ -0,0 +1,114 @@
+import io
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from PIL import Image
+from database import AnalysisCache, connection
+
+HASH_BITS = 64
+HASH_MASK = (1 << HASH_BITS) - 1
+
+
+def dhash(source):
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    with Image.open(source) as image:
+        # JPEG draft mode decodes at a reduced scale, which is all a 9x8 hash needs
+        image.draft('L', (64, 64))
+        pixels = list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+
+    # SQLite integers are signed 64-bit
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def hamming(a, b):
+    return ((a ^ b) & HASH_MASK).bit_count()
+
+
+class AnalysisResultCache:
+    def __init__(self, max_entries, ttl_days, max_distance):
+        self.max_entries = max_entries
+        self.ttl = timedelta(days=ttl_days)
+        self.max_distance = max_distance
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def lookup(self, image_hash, prompt_version):
+        with connection():
+            fresh_since = datetime.now() - self.ttl
+            query = AnalysisCache.select(AnalysisCache.id, AnalysisCache.image_hash).where(
+                (AnalysisCache.prompt_version == prompt_version) &
+                (AnalysisCache.last_used_at >= fresh_since)
+            )
+            if self.max_distance == 0:
+                query = query.where(AnalysisCache.image_hash == image_hash)
+
+            best_id, best_distance = None, None
+            for entry_id, entry_hash in query.tuples().iterator():
+                distance = hamming(entry_hash, image_hash)
+                if distance <= self.max_distance and (best_distance is None or distance < best_distance):
+                    best_id, best_distance = entry_id, distance
+
+            if best_id is None:
+                self._count(False)
+                return None
+
+            entry = AnalysisCache.get_by_id(best_id)
+            AnalysisCache.update(
+                hits=AnalysisCache.hits + 1,
+                last_used_at=datetime.now()
+            ).where(AnalysisCache.id == best_id).execute()
+            self._count(True)
+            return json.loads(entry.result)
+
+    def store(self, image_hash, prompt_version, result):
+        with connection():
+            AnalysisCache.create(
+                image_hash=image_hash,
+                prompt_version=prompt_version,
+                result=json.dumps(result, ensure_ascii=False)
+            )
+            self.evict()
+
+    def evict(self):
+        AnalysisCache.delete().where(AnalysisCache.last_used_at < datetime.now() - self.ttl).execute()
+
+        overflow = AnalysisCache.select().count() - self.max_entries
+        if overflow > 0:
+            oldest = (AnalysisCache
+                      .select(AnalysisCache.id)
+                      .order_by(AnalysisCache.last_used_at)
+                      .limit(overflow))
+            AnalysisCache.delete().where(AnalysisCache.id.in_(oldest)).execute()
+
+    def get_metrics(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+analysis_cache = AnalysisResultCache(
+    max_entries=int(os.getenv('ANALYSIS_CACHE_SIZE', 5000)),
+    ttl_days=int(os.getenv('ANALYSIS_CACHE_TTL_DAYS', 30)),
+    max_distance=int(os.getenv('ANALYSIS_CACHE_MAX_DISTANCE', 4))
+)
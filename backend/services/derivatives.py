@@ -0,0 +1,120 @@
+import io
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps, UnidentifiedImageError
+from .storage import storage
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (320, 640, 1280)
+# AVIF needs a Pillow plugin that is not installed, so WebP is the compact format
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DERIVATIVE_RE = re.compile(r'_w\d+\.(jpg|webp)$')
+# Formats Pillow can open without plugins
+SOURCE_EXTS = ('jpg', 'jpeg', 'png', 'webp', 'gif')
+
+
+def pick_width(requested):
+    for width in WIDTHS:
+        if requested <= width:
+            return width
+    return WIDTHS[-1]
+
+
+def is_derivative(key):
+    return DERIVATIVE_RE.search(key) is not None
+
+
+def can_render(key):
+    return not is_derivative(key) and key.rsplit('.', 1)[-1].lower() in SOURCE_EXTS
+
+
+def derivative_name(filename, width, ext):
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}_w{width}.{ext}"
+
+
+class DerivativeService:
+    def __init__(self, storage, workers, max_pending):
+        self.storage = storage
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="derivatives")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def render(self, key, width, ext, data=None):
+        # Only originals get derivatives, otherwise every request could write a new _w*_w* file
+        if is_derivative(key):
+            raise FileNotFoundError(key)
+        target = derivative_name(key, width, ext)
+        if self.storage.exists(target):
+            return target
+
+        image_format, options = FORMATS[ext]
+        if data is None:
+            data = self.storage.read(key)
+        try:
+            image = Image.open(io.BytesIO(data))
+        except UnidentifiedImageError:
+            raise FileNotFoundError(key)
+        with image:
+            image.draft('RGB', (width, width))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((width, width * 4), Image.LANCZOS)
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+
+            output = io.BytesIO()
+            image.save(output, image_format, **options)
+        self.storage.write(target, output.getvalue())
+        return target
+
+    def generate(self, key, data=None):
+        if data is None:
+            data = self.storage.read(key)
+        for width in WIDTHS:
+            for ext in FORMATS:
+                try:
+                    self.render(key, width, ext, data)
+                except Exception:
+                    logger.exception("Failed to render %s at %s px as %s", key, width, ext)
+
+    def _enqueue(self, key, data, limit):
+        with self._lock:
+            if key in self._pending or (limit and len(self._pending) >= limit):
+                return None
+            self._pending.add(key)
+        future = self._pool.submit(self.generate, key, data)
+        future.add_done_callback(lambda _: self._done(key))
+        return future
+
+    def _done(self, key):
+        with self._lock:
+            self._pending.discard(key)
+
+    def submit(self, key, data=None):
+        return self._enqueue(key, data, None)
+
+    def request(self, key):
+        # On-demand work from anonymous requests: one job per key and a bounded backlog
+        return self._enqueue(key, None, self.max_pending)
+
+    def best_key(self, key, width, ext='jpg'):
+        target = derivative_name(key, pick_width(width), ext)
+        return target if self.storage.exists(target) else key
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+derivative_service = DerivativeService(
+    storage,
+    workers=int(os.getenv('DERIVATIVE_WORKERS', 2)),
+    max_pending=int(os.getenv('DERIVATIVE_MAX_PENDING', 32))
+)
@@ -1,12 +1,22 @@
 import os
 import json
+import hashlib
+import threading
+import time
+import httpx
+from concurrent.futures import ThreadPoolExecutor
 from gigachat import GigaChat
 from dotenv import load_dotenv
+from .analysis_cache import analysis_cache, dhash
 
 load_dotenv()
 
 
 class GigaChatService:
+    PROMPT_VERSION = 1
+    TOKEN_REFRESH_MARGIN = 60
+    MAX_RETRIES = 2
+
     def __init__(self):
         self.credentials = os.getenv("GIGACHAT_API_TOKEN")
         self.model = "GigaChat-Pro"
@@ -14,7 +24,136 @@ class GigaChatService:
         if not self.credentials:
             raise ValueError("Укажите GIGACHAT_API_TOKEN в .env")
 
-    def analyze_image(self, image_path: str):
+        self._client = None
+        self._leases = {}
+        self._lock = threading.Lock()
+        self._token_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv("ANALYSIS_CONCURRENCY", 4)),
+            thread_name_prefix="gigachat"
+        )
+        self._metrics = {
+            'images': 0,
+            'token_refreshes': 0,
+            'reconnects': 0,
+            'auth_seconds': 0.0,
+            'upload_seconds': 0.0,
+            'chat_seconds': 0.0
+        }
+
+    def _record(self, name, started):
+        with self._lock:
+            self._metrics[name] += time.perf_counter() - started
+
+    def _token_expiring(self, client):
+        token = client._access_token
+        return token is None or token.expires_at / 1000 - time.time() < self.TOKEN_REFRESH_MARGIN
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = GigaChat(
+                    credentials=self.credentials,
+                    verify_ssl_certs=False,
+                    model=self.model
+                )
+                self._leases[self._client] = 0
+            client = self._client
+            self._leases[client] += 1
+
+        try:
+            # Refresh ahead of expiry so a request never pays for a 401 and a retry.
+            # Only the OAuth call is serialised; _lock stays free for other workers and metrics.
+            if self._token_expiring(client):
+                with self._token_lock:
+                    if self._token_expiring(client):
+                        started = time.perf_counter()
+                        client._update_token()
+                        with self._lock:
+                            self._metrics['auth_seconds'] += time.perf_counter() - started
+                            self._metrics['token_refreshes'] += 1
+        except Exception:
+            self._release(client)
+            raise
+        return client
+
+    def _release(self, client):
+        with self._lock:
+            self._leases[client] -= 1
+            if client is self._client or self._leases[client]:
+                return
+            del self._leases[client]
+        # A replaced client is closed once its last in-flight request is done
+        client.close()
+
+    def _reconnect(self, failed):
+        with self._lock:
+            # Several workers may fail on the same client; only the first one swaps it
+            if failed is not None and self._client is failed:
+                self._client = None
+                self._metrics['reconnects'] += 1
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            client, self._client = self._client, None
+            idle = client is not None and not self._leases.get(client)
+            if idle:
+                del self._leases[client]
+        if idle:
+            client.close()
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        if metrics['images']:
+            for name in ('auth_seconds', 'upload_seconds', 'chat_seconds'):
+                metrics[f'avg_{name}'] = metrics[name] / metrics['images']
+        metrics['cache'] = analysis_cache.get_metrics()
+        return metrics
+
+    def analyze_image(self, image):
+        try:
+            image_hash = dhash(image)
+        except Exception:
+            image_hash = None
+
+        if image_hash is not None:
+            cached = analysis_cache.lookup(image_hash, self.PROMPT_VERSION)
+            if cached is not None:
+                return cached
+
+        result = self._request_analysis(image)
+
+        if image_hash is not None and 'raw' not in result:
+            analysis_cache.store(image_hash, self.PROMPT_VERSION, result)
+        return result
+
+    def analyze_images(self, images, return_exceptions=False):
+        # Identical files are analysed once and share the verdict
+        futures = {}
+        keys = []
+        for image in images:
+            if isinstance(image, bytes):
+                key = hashlib.sha256(image).hexdigest()
+            else:
+                with open(image, "rb") as file:
+                    key = hashlib.sha256(file.read()).hexdigest()
+            if key not in futures:
+                futures[key] = self._pool.submit(self.analyze_image, image)
+            keys.append(key)
+
+        results = []
+        for key in keys:
+            try:
+                results.append(futures[key].result())
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+    def _request_analysis(self, image):
         prompt = """Проанализируй это изображение на наличие экологических загрязнений.
 
     Если на фото есть мусор, свалка или другие загрязнения, опиши:
@@ -42,26 +181,46 @@ class GigaChatService:
         "message": "На фото нет экологических загрязнений"
     }"""
 
-        with GigaChat(
-            credentials=self.credentials,
-            verify_ssl_certs=False,
-            model=self.model
-        ) as giga:
-            with open(image_path, "rb") as file:
-                file_obj = giga.upload_file(file)
-
-            response = giga.chat(
-                {
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt,
-                            "attachments": [file_obj.id_],
-                        }
-                    ],
-                    "temperature": 0.7
-                }
-            )
+        for attempt in range(self.MAX_RETRIES + 1):
+            giga = None
+            try:
+                giga = self._get_client()
+
+                started = time.perf_counter()
+                # Images may arrive as in-memory bytes straight from the bot
+                if isinstance(image, bytes):
+                    file_obj = giga.upload_file(("image.jpg", image, "image/jpeg"))
+                else:
+                    with open(image, "rb") as file:
+                        file_obj = giga.upload_file(file)
+                self._record('upload_seconds', started)
+
+                started = time.perf_counter()
+                response = giga.chat(
+                    {
+                        "messages": [
+                            {
+                                "role": "user",
+                                "content": prompt,
+                                "attachments": [file_obj.id_],
+                            }
+                        ],
+                        "temperature": 0.7
+                    }
+                )
+                self._record('chat_seconds', started)
+                break
+            except httpx.TransportError:
+                if attempt == self.MAX_RETRIES:
+                    raise
+                self._reconnect(giga)
+                time.sleep(0.5 * 2 ** attempt)
+            finally:
+                if giga is not None:
+                    self._release(giga)
+
+        with self._lock:
+            self._metrics['images'] += 1
 
         text = response.choices[0].message.content
 
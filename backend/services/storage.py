@@ -0,0 +1,171 @@
+import hashlib
+import os
+import tempfile
+from dotenv import load_dotenv
+from werkzeug.security import safe_join
+
+load_dotenv()
+
+UPLOAD_STORAGE = os.getenv('UPLOAD_STORAGE', 'local')
+UPLOADS_DIR = os.getenv('UPLOADS_DIR', os.path.join(os.path.dirname(__file__), '..', '..', 'uploads'))
+
+
+CONTENT_TYPES = {
+    'jpg': 'image/jpeg',
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'gif': 'image/gif',
+    'heic': 'image/heic',
+    'bin': 'application/octet-stream',
+}
+
+
+def detect_ext(data):
+    # Documents arrive as PNG/WebP/HEIC too, so the extension comes from the bytes, not the sender
+    if data[:3] == b'\xff\xd8\xff':
+        return 'jpg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if data[4:8] == b'ftyp' and data[8:12] in (b'heic', b'heix', b'mif1', b'msf1'):
+        return 'heic'
+    return 'bin'
+
+
+def content_key(data, ext=None):
+    ext = ext or detect_ext(data)
+    digest = hashlib.sha256(data).hexdigest()
+    # Two levels of 256 shards keep every directory small even with millions of photos
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+
+class Storage:
+    def local_path(self, key):
+        return None
+
+    def url(self, key, expires=3600):
+        return None
+
+    def save(self, data, ext=None):
+        key = content_key(data, ext)
+        # Identical photos hash to the same key and are stored once
+        if not self.exists(key):
+            self.write(key, data)
+        return key
+
+
+class LocalStorage(Storage):
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def local_path(self, key):
+        path = safe_join(self.root, key)
+        if path is None:
+            raise FileNotFoundError(key)
+        return path
+
+    def exists(self, key):
+        return os.path.exists(self.local_path(key))
+
+    def read(self, key):
+        with open(self.local_path(key), 'rb') as file:
+            return file.read()
+
+    def write(self, key, data):
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A unique temp file per write, so threads rendering the same key never share one
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.chmod(temp, 0o644)
+            os.replace(temp, path)
+        except BaseException:
+            os.remove(temp)
+            raise
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage(Storage):
+    def __init__(self, bucket, prefix='', client=None, endpoint_url=None, region=None, access_key=None, secret_key=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("UPLOAD_STORAGE=s3 requires boto3")
+            client = boto3.client(
+                's3',
+                endpoint_url=endpoint_url,
+                region_name=region,
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key
+            )
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.client = client
+
+    def is_missing(self, error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def object_key(self, key):
+        if '..' in key.split('/'):
+            raise FileNotFoundError(key)
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except self.client.exceptions.ClientError as e:
+            if self.is_missing(e):
+                return False
+            raise
+
+    def read(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))
+        except self.client.exceptions.ClientError as e:
+            if self.is_missing(e):
+                raise FileNotFoundError(key)
+            raise
+        return response['Body'].read()
+
+    def write(self, key, data):
+        content_type = CONTENT_TYPES.get(key.rsplit('.', 1)[-1], CONTENT_TYPES['bin'])
+        self.client.put_object(Bucket=self.bucket, Key=self.object_key(key), Body=data, ContentType=content_type)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+
+    def url(self, key, expires=3600):
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': self.object_key(key)}, ExpiresIn=expires
+        )
+
+
+def create_storage(kind):
+    if kind == 'local':
+        return LocalStorage(UPLOADS_DIR)
+    if kind == 's3':
+        return S3Storage(
+            bucket=os.getenv('S3_BUCKET'),
+            prefix=os.getenv('S3_PREFIX', 'uploads'),
+            endpoint_url=os.getenv('S3_ENDPOINT_URL'),
+            region=os.getenv('S3_REGION'),
+            access_key=os.getenv('S3_ACCESS_KEY'),
+            secret_key=os.getenv('S3_SECRET_KEY')
+        )
+    raise ValueError(f"Unsupported UPLOAD_STORAGE: {kind}")
+
+
+storage = create_storage(UPLOAD_STORAGE)
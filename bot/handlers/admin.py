@@ -3,54 +3,56 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import FSInputFile
+from aiogram.types import BufferedInputFile
+from aiogram.exceptions import TelegramBadRequest
 
+import asyncio
 import os
 import math
 
 from bot.keyboards import admin_menu_keyboard, main_menu_keyboard, cancel_keyboard, cancel_admin_keyboard
-from bot.utils import get_reports, update_report_status, delete_report
-from database import Admin, User, db, Review
+from bot.utils import get_reports_page, get_report, set_report_file_id, get_stats, update_report_status, delete_report, delete_review
+from bot.middlewares import admin_cache
+from backend.services import storage, derivative_service
+from database import Admin, User, Review, connection
 
 
 router = Router()
 
 ITEMS_PER_PAGE = 10
+LIST_FIELDS = ['id', 'waste_type', 'danger_level', 'status']
+DETAIL_FIELDS = ['id', 'username', 'photo_path', 'telegram_file_id', 'waste_type', 'danger_level', 'status', 'latitude', 'longitude', 'description', 'created_at']
 
 class AdminStates(StatesGroup):
     waiting_for_password = State()
 
-def is_admin(telegram_id):
-    db.connect(reuse_if_open=True)
-    try:
-        admin = Admin.get((Admin.telegram_id == telegram_id) & (Admin.is_active == True))
-        db.close()
-        return True
-    except:
-        db.close()
-        return False
+def item_id(item):
+    return item['id'] if isinstance(item, dict) else item.id
+
+def anchor_token(item, sort_key):
+    # Sort values that can change (a user's rating) travel with the anchor so page boundaries stay put
+    return f"{item_id(item)}.{sort_key(item)}" if sort_key else str(item_id(item))
 
-def create_pagination_keyboard(items, page, total_pages, prefix, callback_data_template):
+def create_pagination_keyboard(items, page, total_pages, prefix, callback_data_template, sort_key=None):
     keyboard = []
     
-    start_idx = page * ITEMS_PER_PAGE
-    end_idx = min(start_idx + ITEMS_PER_PAGE, len(items))
-    
-    for i in range(start_idx, end_idx):
-        item = items[i]
+    for item in items:
         keyboard.append([InlineKeyboardButton(
             text=callback_data_template(item),
-            callback_data=f"{prefix}_{item['id'] if isinstance(item, dict) else item.id}"
+            callback_data=f"{prefix}_{item_id(item)}"
         )])
     
+    # Page buttons carry the id of the boundary row so the next page is a keyset lookup
     nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"{prefix}_page_{page-1}"))
+    if page > 1:
+        nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"{prefix}_page_{page-1}_b{anchor_token(items[0], sort_key)}"))
+    elif page == 1:
+        nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"{prefix}_page_0"))
     
     nav_buttons.append(InlineKeyboardButton(text=f"{page+1}/{total_pages}", callback_data="noop"))
     
     if page < total_pages - 1:
-        nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"{prefix}_page_{page+1}"))
+        nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"{prefix}_page_{page+1}_a{anchor_token(items[-1], sort_key)}"))
     
     if nav_buttons:
         keyboard.append(nav_buttons)
@@ -59,9 +61,124 @@ def create_pagination_keyboard(items, page, total_pages, prefix, callback_data_t
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+def parse_page_callback(data):
+    parts = data.split("_")
+    index = parts.index("page")
+    page = int(parts[index + 1])
+    if len(parts) > index + 2:
+        anchor = parts[index + 2]
+        anchor_id, _, anchor_value = anchor[1:].partition(".")
+        return page, anchor[0], int(anchor_id), anchor_value or None
+    return page, None, None, None
+
+async def send_report_photo(message, report, text, keyboard):
+    file_id = report.get('telegram_file_id')
+    if file_id:
+        try:
+            return await message.answer_photo(photo=file_id, caption=text, parse_mode='HTML', reply_markup=keyboard)
+        except TelegramBadRequest:
+            pass
+    
+    # No usable file_id: upload once from disk and remember the id Telegram assigns
+    loop = asyncio.get_running_loop()
+    key = await loop.run_in_executor(None, derivative_service.best_key, report['photo_path'], 1280)
+    data = await loop.run_in_executor(None, storage.read, key)
+    sent = await message.answer_photo(
+        photo=BufferedInputFile(data, filename=os.path.basename(key)),
+        caption=text,
+        parse_mode='HTML',
+        reply_markup=keyboard
+    )
+    await set_report_file_id(report['id'], sent.photo[-1].file_id)
+    return sent
+
+def keyset_page(query, model, sort_field, direction=None, anchor_id=None, value=None):
+    if anchor_id and value is None:
+        anchor = model.get_or_none(model.id == anchor_id)
+        if anchor is not None:
+            value = getattr(anchor, sort_field.name)
+    
+    # Returns the rows and whether the anchor was found; a missing anchor means the first page
+    if value is None:
+        return list(query.order_by(sort_field.desc(), model.id.desc()).limit(ITEMS_PER_PAGE)), not anchor_id
+    
+    if direction == 'b':
+        items = list(query.where(
+            (sort_field > value) | ((sort_field == value) & (model.id > anchor_id))
+        ).order_by(sort_field.asc(), model.id.asc()).limit(ITEMS_PER_PAGE))
+        items.reverse()
+        return items, True
+    
+    return list(query.where(
+        (sort_field < value) | ((sort_field == value) & (model.id < anchor_id))
+    ).order_by(sort_field.desc(), model.id.desc()).limit(ITEMS_PER_PAGE)), True
+
+def paginated_list(items, total, page, prefix, callback_data_template, sort_key=None):
+    if not items:
+        return None
+    total_pages = max(math.ceil(total / ITEMS_PER_PAGE), page + 1)
+    keyboard = create_pagination_keyboard(items, page, total_pages, prefix, callback_data_template, sort_key)
+    return total, total_pages, keyboard, page
+
+async def reports_page(page, direction, anchor_id, **filters):
+    result = await get_reports_page(
+        after_id=anchor_id if direction == 'a' else None,
+        before_id=anchor_id if direction == 'b' else None,
+        limit=ITEMS_PER_PAGE,
+        fields=LIST_FIELDS,
+        **filters
+    )
+    if result is None:
+        # The anchor report was deleted, so the page number no longer means anything
+        page = 0
+        result = await get_reports_page(limit=ITEMS_PER_PAGE, fields=LIST_FIELDS, **filters)
+    reports, total = result
+    return reports, total, page
+
+async def new_reports_list(page=0, direction=None, anchor_id=None, anchor_value=None):
+    reports, total, page = await reports_page(page, direction, anchor_id, status='new')
+    return paginated_list(
+        reports, total, page, "new_report",
+        lambda r: f"📋 #{r['id']} - {r['waste_type']} ({r['danger_level']})"
+    )
+
+async def unsolved_reports_list(page=0, direction=None, anchor_id=None, anchor_value=None):
+    reports, total, page = await reports_page(page, direction, anchor_id, exclude_status='resolved')
+    return paginated_list(
+        reports, total, page, "unsolved_report",
+        lambda r: f"📋 #{r['id']} - {r['waste_type']} | {get_status_emoji(r['status'])}"
+    )
+
+def reviews_list(page=0, direction=None, anchor_id=None, anchor_value=None):
+    with connection():
+        query = Review.select(Review, User).join(User)
+        reviews, found = keyset_page(query, Review, Review.created_at, direction, anchor_id)
+        total = Review.select().count()
+    if not found:
+        page = 0
+    
+    return paginated_list(
+        reviews, total, page, "review",
+        lambda r: f"⭐ @{r.user.username or 'Неизвестно'} - {r.text[:30]}..."
+    )
+
+def users_list(page=0, direction=None, anchor_id=None, anchor_value=None):
+    rating = int(anchor_value) if anchor_value is not None else None
+    with connection():
+        users, found = keyset_page(User.select(), User, User.rating, direction, anchor_id, rating)
+        total = User.select().count()
+    if not found:
+        page = 0
+    
+    return paginated_list(
+        users, total, page, "user",
+        lambda u: f"👤 @{u.username or 'Неизвестно'} | {u.reports_count} отчётов | {u.rating} ⭐",
+        sort_key=lambda u: u.rating
+    )
+
 @router.message(Command("admin"))
-async def admin_login(message: Message, state: FSMContext):
-    if is_admin(message.from_user.id):
+async def admin_login(message: Message, state: FSMContext, is_admin: bool):
+    if is_admin:
         await message.answer(
             "👨‍💼 Добро пожаловать в админ-панель!",
             reply_markup=admin_menu_keyboard()
@@ -84,18 +201,18 @@ async def cancel_admin(message: Message, state: FSMContext):
 @router.message(AdminStates.waiting_for_password)
 async def process_admin_password(message: Message, state: FSMContext):
     if message.text == os.getenv('ADMIN_PASSWORD'):
-        db.connect(reuse_if_open=True)
-        try:
-            admin = Admin.get(Admin.telegram_id == message.from_user.id)
-            admin.is_active = True
-            admin.save()
-        except:
-            Admin.create(
-                telegram_id=message.from_user.id,
-                username=message.from_user.username,
-                is_active=True
-            )
-        db.close()
+        with connection():
+            try:
+                admin = Admin.get(Admin.telegram_id == message.from_user.id)
+                admin.is_active = True
+                admin.save()
+            except:
+                Admin.create(
+                    telegram_id=message.from_user.id,
+                    username=message.from_user.username,
+                    is_active=True
+                )
+        admin_cache.add(message.from_user.id)
         
         await state.clear()
         await message.answer(
@@ -113,62 +230,44 @@ async def admin_logout(message: Message):
     )
 
 @router.message(F.text == "📋 Новые отчёты")
-async def show_new_reports(message: Message):
-    if not is_admin(message.from_user.id):
+async def show_new_reports(message: Message, is_admin: bool):
+    if not is_admin:
         await message.answer("❌ У вас нет прав администратора")
         return
     
-    reports = await get_reports(status='new')
+    listing = await new_reports_list()
     
-    if not reports:
+    if not listing:
         await message.answer("📋 Нет новых отчётов")
         return
     
-    total_pages = math.ceil(len(reports) / ITEMS_PER_PAGE)
-    
-    keyboard = create_pagination_keyboard(
-        reports, 
-        0, 
-        total_pages, 
-        "new_report",
-        lambda r: f"📋 #{r['id']} - {r['waste_type']} ({r['danger_level']})"
-    )
+    total, total_pages, keyboard, _ = listing
     
     await message.answer(
         f"📋 <b>Новые отчёты</b>\n\n"
-        f"Всего: {len(reports)}\n"
+        f"Всего: {total}\n"
         f"Выберите отчёт для просмотра:",
         parse_mode='HTML',
         reply_markup=keyboard
     )
 
 @router.message(F.text == "💬 Отзывы")
-async def show_reviews_list(message: Message):
-    if not is_admin(message.from_user.id):
+async def show_reviews_list(message: Message, is_admin: bool):
+    if not is_admin:
         await message.answer("❌ У вас нет прав администратора")
         return
 
-    db.connect(reuse_if_open=True)
-    reviews = list(Review.select().order_by(Review.created_at.desc()))
-    db.close()
+    listing = reviews_list()
 
-    if not reviews:
+    if not listing:
         await message.answer("💬 Нет отзывов")
         return
 
-    total_pages = math.ceil(len(reviews) / ITEMS_PER_PAGE)
-
-    keyboard = create_pagination_keyboard(
-        reviews,
-        0,
-        total_pages,
-        "review",
-        lambda r: f"⭐ @{r.user.username or 'Неизвестно'} - {r.text[:30]}..."
-    )
+    total, total_pages, keyboard, _ = listing
 
     await message.answer(
         f"💬 <b>Отзывы</b>\n\n"
-        f"Всего: {len(reviews)}\n"
+        f"Всего: {total}\n"
         f"Выберите отзыв:",
         parse_mode='HTML',
         reply_markup=keyboard
@@ -176,31 +275,24 @@ async def show_reviews_list(message: Message):
 
 
 @router.callback_query(F.data.startswith("review_page_"))
-async def reviews_page(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
+async def reviews_page(callback: CallbackQuery, is_admin: bool):
+    if not is_admin:
         await callback.answer("❌ У вас нет прав администратора", show_alert=True)
         return
 
-    page = int(callback.data.split("_")[-1])
-
-    db.connect(reuse_if_open=True)
-    reviews = list(Review.select().order_by(Review.created_at.desc()))
-    db.close()
+    page, direction, anchor_id, anchor_value = parse_page_callback(callback.data)
+    listing = reviews_list(page, direction, anchor_id, anchor_value)
 
-    total_pages = math.ceil(len(reviews) / ITEMS_PER_PAGE)
+    if not listing:
+        await callback.answer("💬 Нет отзывов")
+        return
 
-    keyboard = create_pagination_keyboard(
-        reviews,
-        page,
-        total_pages,
-        "review",
-        lambda r: f"⭐ @{r.user.username or 'Неизвестно'} - {r.text[:30]}..."
-    )
+    total, total_pages, keyboard, page = listing
 
     await callback.message.edit_text(
         f"💬 <b>Отзывы</b>\n\n"
-        f"Всего: {len(reviews)}\n"
-        f"Страница {page + 1}/{total_pages}\n"
+        f"Всего: {total}\n"
+        f"Страница {page+1}/{total_pages}\n"
         f"Выберите отзыв:",
         parse_mode='HTML',
         reply_markup=keyboard
@@ -209,19 +301,18 @@ async def reviews_page(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("review_") & ~F.data.contains("page"))
-async def show_review_detail(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
+async def show_review_detail(callback: CallbackQuery, is_admin: bool):
+    if not is_admin:
         await callback.answer("❌ У вас нет прав администратора", show_alert=True)
         return
 
     review_id = int(callback.data.split("_")[-1])
 
-    db.connect(reuse_if_open=True)
-    try:
-        review = Review.get_by_id(review_id)
-    except:
+    with connection():
+        review = Review.select(Review, User).join(User).where(Review.id == review_id).first()
+
+    if review is None:
         await callback.answer("❌ Отзыв не найден", show_alert=True)
-        db.close()
         return
 
     text = (
@@ -231,8 +322,6 @@ async def show_review_detail(callback: CallbackQuery):
         f"📅 Дата: {review.created_at.strftime('%d.%m.%Y %H:%M')}"
     )
 
-    db.close()
-
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text="🗑 Удалить отзыв", callback_data=f"delete_review_{review_id}")],
@@ -249,57 +338,42 @@ async def show_review_detail(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("delete_review_"))
-async def delete_review_handler(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
+async def delete_review_handler(callback: CallbackQuery, is_admin: bool):
+    if not is_admin:
         await callback.answer("❌ У вас нет прав администратора", show_alert=True)
         return
 
     review_id = int(callback.data.split("_")[-1])
 
-    import aiohttp
-    backend_url = os.getenv('BACKEND_URL', 'http://localhost:5000')
-
-    async with aiohttp.ClientSession() as session:
-        async with session.delete(f'{backend_url}/api/reviews/{review_id}') as response:
-            if response.status == 200:
-                await callback.answer("🗑 Отзыв удалён", show_alert=True)
+    if await delete_review(review_id):
+        await callback.answer("🗑 Отзыв удалён", show_alert=True)
 
-                try:
-                    await callback.message.delete()
-                except:
-                    pass
-            else:
-                await callback.answer("❌ Ошибка удаления", show_alert=True)
+        try:
+            await callback.message.delete()
+        except:
+            pass
+    else:
+        await callback.answer("❌ Ошибка удаления", show_alert=True)
 
 
 @router.callback_query(F.data == "back_to_reviews")
-async def back_to_reviews_list(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
+async def back_to_reviews_list(callback: CallbackQuery, is_admin: bool):
+    if not is_admin:
         await callback.answer("❌ У вас нет прав администратора", show_alert=True)
         return
 
-    db.connect(reuse_if_open=True)
-    reviews = list(Review.select().order_by(Review.created_at.desc()))
-    db.close()
+    listing = reviews_list()
 
-    if not reviews:
+    if not listing:
         await callback.message.answer("💬 Нет отзывов")
         await callback.answer()
         return
 
-    total_pages = math.ceil(len(reviews) / ITEMS_PER_PAGE)
-
-    keyboard = create_pagination_keyboard(
-        reviews,
-        0,
-        total_pages,
-        "review",
-        lambda r: f"⭐ @{r.user.username or 'Неизвестно'} - {r.text[:30]}..."
-    )
+    total, total_pages, keyboard, _ = listing
 
     await callback.message.answer(
         f"💬 <b>Отзывы</b>\n\n"
-        f"Всего: {len(reviews)}\n"
+        f"Всего: {total}\n"
         f"Выберите отзыв:",
         parse_mode='HTML',
         reply_markup=keyboard
@@ -312,28 +386,25 @@ async def back_to_reviews_list(callback: CallbackQuery):
 
     await callback.answer()
 
+
 @router.callback_query(F.data.startswith("new_report_page_"))
-async def new_reports_page(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
+async def new_reports_page(callback: CallbackQuery, is_admin: bool):
+    if not is_admin:
         await callback.answer("❌ У вас нет прав администратора", show_alert=True)
         return
     
-    page = int(callback.data.split("_")[-1])
-    reports = await get_reports(status='new')
+    page, direction, anchor_id, anchor_value = parse_page_callback(callback.data)
+    listing = await new_reports_list(page, direction, anchor_id, anchor_value)
     
-    total_pages = math.ceil(len(reports) / ITEMS_PER_PAGE)
+    if not listing:
+        await callback.answer("📋 Нет новых отчётов")
+        return
     
-    keyboard = create_pagination_keyboard(
-        reports, 
-        page, 
-        total_pages, 
-        "new_report",
-        lambda r: f"📋 #{r['id']} - {r['waste_type']} ({r['danger_level']})"
-    )
+    total, total_pages, keyboard, page = listing
     
     await callback.message.edit_text(
         f"📋 <b>Новые отчёты</b>\n\n"
-        f"Всего: {len(reports)}\n"
+        f"Всего: {total}\n"
         f"Страница {page+1}/{total_pages}\n"
         f"Выберите отчёт для просмотра:",
         parse_mode='HTML',
@@ -342,21 +413,18 @@ async def new_reports_page(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("new_report_") & ~F.data.contains("page"))
-async def show_new_report_detail(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
+async def show_new_report_detail(callback: CallbackQuery, is_admin: bool):
+    if not is_admin:
         await callback.answer("❌ У вас нет прав администратора", show_alert=True)
         return
     
     report_id = int(callback.data.split("_")[-1])
-    reports = await get_reports()
-    report = next((r for r in reports if r['id'] == report_id), None)
+    report = await get_report(report_id, fields=DETAIL_FIELDS)
     
     if not report:
         await callback.answer("❌ Отчёт не найден", show_alert=True)
         return
     
-    photo_path = os.path.join('uploads', report['photo_path'])
-    
     text = (
         f"📋 <b>Отчёт #{report['id']}</b>\n\n"
         f"👤 Пользователь: @{report.get('username', 'Неизвестно')}\n"
@@ -387,13 +455,7 @@ async def show_new_report_detail(callback: CallbackQuery):
     )
     
     try:
-        photo_file = FSInputFile(photo_path)
-        await callback.message.answer_photo(
-            photo=photo_file,
-            caption=text,
-            parse_mode='HTML',
-            reply_markup=keyboard
-        )
+        await send_report_photo(callback.message, report, text, keyboard)
         await callback.message.delete()
     except Exception as e:
         await callback.message.answer(
@@ -409,31 +471,23 @@ async def show_new_report_detail(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "back_to_new")
-async def back_to_new_list(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
+async def back_to_new_list(callback: CallbackQuery, is_admin: bool):
+    if not is_admin:
         await callback.answer("❌ У вас нет прав администратора", show_alert=True)
         return
     
-    reports = await get_reports(status='new')
+    listing = await new_reports_list()
     
-    if not reports:
+    if not listing:
         await callback.message.answer("📋 Нет новых отчётов")
         await callback.answer()
         return
     
-    total_pages = math.ceil(len(reports) / ITEMS_PER_PAGE)
-    
-    keyboard = create_pagination_keyboard(
-        reports, 
-        0, 
-        total_pages, 
-        "new_report",
-        lambda r: f"📋 #{r['id']} - {r['waste_type']} ({r['danger_level']})"
-    )
+    total, total_pages, keyboard, _ = listing
     
     await callback.message.answer(
         f"📋 <b>Новые отчёты</b>\n\n"
-        f"Всего: {len(reports)}\n"
+        f"Всего: {total}\n"
         f"Выберите отчёт для просмотра:",
         parse_mode='HTML',
         reply_markup=keyboard
@@ -447,59 +501,45 @@ async def back_to_new_list(callback: CallbackQuery):
     await callback.answer()
 
 @router.message(F.text == "🔍 Нерешённые отчёты")
-async def show_unsolved_reports(message: Message):
-    if not is_admin(message.from_user.id):
+async def show_unsolved_reports(message: Message, is_admin: bool):
+    if not is_admin:
         await message.answer("❌ У вас нет прав администратора")
         return
     
-    all_reports = await get_reports()
-    unsolved = [r for r in all_reports if r['status'] != 'resolved']
+    listing = await unsolved_reports_list()
     
-    if not unsolved:
+    if not listing:
         await message.answer("📋 Нет нерешённых отчётов")
         return
     
-    total_pages = math.ceil(len(unsolved) / ITEMS_PER_PAGE)
-    
-    keyboard = create_pagination_keyboard(
-        unsolved, 
-        0, 
-        total_pages, 
-        "unsolved_report",
-        lambda r: f"📋 #{r['id']} - {r['waste_type']} | {get_status_emoji(r['status'])}"
-    )
+    total, total_pages, keyboard, _ = listing
     
     await message.answer(
         f"📋 <b>Нерешённые отчёты</b>\n\n"
-        f"Всего: {len(unsolved)}\n"
+        f"Всего: {total}\n"
         f"Выберите отчёт для редактирования:",
         parse_mode='HTML',
         reply_markup=keyboard
     )
 
 @router.callback_query(F.data.startswith("unsolved_report_page_"))
-async def unsolved_reports_page(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
+async def unsolved_reports_page(callback: CallbackQuery, is_admin: bool):
+    if not is_admin:
         await callback.answer("❌ У вас нет прав администратора", show_alert=True)
         return
     
-    page = int(callback.data.split("_")[-1])
-    all_reports = await get_reports()
-    unsolved = [r for r in all_reports if r['status'] != 'resolved']
+    page, direction, anchor_id, anchor_value = parse_page_callback(callback.data)
+    listing = await unsolved_reports_list(page, direction, anchor_id, anchor_value)
     
-    total_pages = math.ceil(len(unsolved) / ITEMS_PER_PAGE)
+    if not listing:
+        await callback.answer("📋 Нет нерешённых отчётов")
+        return
     
-    keyboard = create_pagination_keyboard(
-        unsolved, 
-        page, 
-        total_pages, 
-        "unsolved_report",
-        lambda r: f"📋 #{r['id']} - {r['waste_type']} | {get_status_emoji(r['status'])}"
-    )
+    total, total_pages, keyboard, page = listing
     
     await callback.message.edit_text(
         f"📋 <b>Нерешённые отчёты</b>\n\n"
-        f"Всего: {len(unsolved)}\n"
+        f"Всего: {total}\n"
         f"Страница {page+1}/{total_pages}\n"
         f"Выберите отчёт для редактирования:",
         parse_mode='HTML',
@@ -508,21 +548,18 @@ async def unsolved_reports_page(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("unsolved_report_") & ~F.data.contains("page"))
-async def show_unsolved_report_detail(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
+async def show_unsolved_report_detail(callback: CallbackQuery, is_admin: bool):
+    if not is_admin:
         await callback.answer("❌ У вас нет прав администратора", show_alert=True)
         return
     
     report_id = int(callback.data.split("_")[-1])
-    reports = await get_reports()
-    report = next((r for r in reports if r['id'] == report_id), None)
+    report = await get_report(report_id, fields=DETAIL_FIELDS)
     
     if not report:
         await callback.answer("❌ Отчёт не найден", show_alert=True)
         return
     
-    photo_path = os.path.join('uploads', report['photo_path'])
-    
     text = (
         f"📋 <b>Отчёт #{report['id']}</b>\n\n"
         f"👤 Пользователь: @{report.get('username', 'Неизвестно')}\n"
@@ -554,13 +591,7 @@ async def show_unsolved_report_detail(callback: CallbackQuery):
     )
     
     try:
-        photo_file = FSInputFile(photo_path)
-        await callback.message.answer_photo(
-            photo=photo_file,
-            caption=text,
-            parse_mode='HTML',
-            reply_markup=keyboard
-        )
+        await send_report_photo(callback.message, report, text, keyboard)
         await callback.message.delete()
     except:
         await callback.message.answer(
@@ -576,32 +607,23 @@ async def show_unsolved_report_detail(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "back_to_unsolved")
-async def back_to_unsolved_list(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
+async def back_to_unsolved_list(callback: CallbackQuery, is_admin: bool):
+    if not is_admin:
         await callback.answer("❌ У вас нет прав администратора", show_alert=True)
         return
     
-    all_reports = await get_reports()
-    unsolved = [r for r in all_reports if r['status'] != 'resolved']
+    listing = await unsolved_reports_list()
     
-    if not unsolved:
+    if not listing:
         await callback.message.answer("📋 Нет нерешённых отчётов")
         await callback.answer()
         return
     
-    total_pages = math.ceil(len(unsolved) / ITEMS_PER_PAGE)
-    
-    keyboard = create_pagination_keyboard(
-        unsolved, 
-        0, 
-        total_pages, 
-        "unsolved_report",
-        lambda r: f"📋 #{r['id']} - {r['waste_type']} | {get_status_emoji(r['status'])}"
-    )
+    total, total_pages, keyboard, _ = listing
     
     await callback.message.answer(
         f"📋 <b>Нерешённые отчёты</b>\n\n"
-        f"Всего: {len(unsolved)}\n"
+        f"Всего: {total}\n"
         f"Выберите отчёт для редактирования:",
         parse_mode='HTML',
         reply_markup=keyboard
@@ -615,8 +637,8 @@ async def back_to_unsolved_list(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("status_"))
-async def change_status(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
+async def change_status(callback: CallbackQuery, is_admin: bool):
+    if not is_admin:
         await callback.answer("❌ У вас нет прав администратора", show_alert=True)
         return
     
@@ -638,8 +660,7 @@ async def change_status(callback: CallbackQuery):
         comment=f"Изменено администратором @{callback.from_user.username}"
     )
     
-    reports = await get_reports()
-    report = next((r for r in reports if r['id'] == report_id), None)
+    report = await get_report(report_id, fields=['user_id', 'waste_type'])
     
     if report:
         try:
@@ -666,8 +687,8 @@ async def change_status(callback: CallbackQuery):
         pass
 
 @router.callback_query(F.data.startswith("delete_"))
-async def delete_report_handler(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
+async def delete_report_handler(callback: CallbackQuery, is_admin: bool):
+    if not is_admin:
         await callback.answer("❌ У вас нет прав администратора", show_alert=True)
         return
     
@@ -683,21 +704,15 @@ async def delete_report_handler(callback: CallbackQuery):
         pass
 
 @router.message(F.text == "📊 Статистика")
-async def show_admin_stats(message: Message):
-    if not is_admin(message.from_user.id):
+async def show_admin_stats(message: Message, is_admin: bool):
+    if not is_admin:
         await message.answer("❌ У вас нет прав администратора")
         return
     
-    import aiohttp
-    backend_url = os.getenv('BACKEND_URL', 'http://localhost:5000')
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f'{backend_url}/api/stats') as response:
-            if response.status != 200:
-                await message.answer("❌ Ошибка получения статистики")
-                return
-            
-            stats = await response.json()
+    stats = await get_stats()
+    if not stats:
+        await message.answer("❌ Ошибка получения статистики")
+        return
     
     text = (
         f"📊 <b>Общая статистика</b>\n\n"
@@ -732,62 +747,45 @@ async def show_admin_stats(message: Message):
     await message.answer(text, parse_mode='HTML')
 
 @router.message(F.text == "👥 Пользователи")
-async def show_users_list(message: Message):
-    if not is_admin(message.from_user.id):
+async def show_users_list(message: Message, is_admin: bool):
+    if not is_admin:
         await message.answer("❌ У вас нет прав администратора")
         return
     
-    db.connect(reuse_if_open=True)
-    users = list(User.select().order_by(User.rating.desc()))
-    db.close()
+    listing = users_list()
     
-    if not users:
+    if not listing:
         await message.answer("👥 Нет пользователей")
         return
     
-    total_pages = math.ceil(len(users) / ITEMS_PER_PAGE)
-    
-    keyboard = create_pagination_keyboard(
-        users, 
-        0, 
-        total_pages, 
-        "user",
-        lambda u: f"👤 @{u.username or 'Неизвестно'} | {u.reports_count} отчётов | {u.rating} ⭐"
-    )
+    total, total_pages, keyboard, _ = listing
     
     await message.answer(
         f"👥 <b>Пользователи</b>\n\n"
-        f"Всего: {len(users)}\n"
+        f"Всего: {total}\n"
         f"Выберите пользователя:",
         parse_mode='HTML',
         reply_markup=keyboard
     )
 
 @router.callback_query(F.data.startswith("user_page_"))
-async def users_page(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
+async def users_page(callback: CallbackQuery, is_admin: bool):
+    if not is_admin:
         await callback.answer("❌ У вас нет прав администратора", show_alert=True)
         return
     
-    page = int(callback.data.split("_")[-1])
+    page, direction, anchor_id, anchor_value = parse_page_callback(callback.data)
+    listing = users_list(page, direction, anchor_id, anchor_value)
     
-    db.connect(reuse_if_open=True)
-    users = list(User.select().order_by(User.rating.desc()))
-    db.close()
+    if not listing:
+        await callback.answer("👥 Нет пользователей")
+        return
     
-    total_pages = math.ceil(len(users) / ITEMS_PER_PAGE)
-    
-    keyboard = create_pagination_keyboard(
-        users, 
-        page, 
-        total_pages, 
-        "user",
-        lambda u: f"👤 @{u.username or 'Неизвестно'} | {u.reports_count} отчётов | {u.rating} ⭐"
-    )
+    total, total_pages, keyboard, page = listing
     
     await callback.message.edit_text(
         f"👥 <b>Пользователи</b>\n\n"
-        f"Всего: {len(users)}\n"
+        f"Всего: {total}\n"
         f"Страница {page+1}/{total_pages}\n"
         f"Выберите пользователя:",
         parse_mode='HTML',
@@ -796,24 +794,21 @@ async def users_page(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("user_") & ~F.data.contains("page"))
-async def show_user_detail(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
+async def show_user_detail(callback: CallbackQuery, is_admin: bool):
+    if not is_admin:
         await callback.answer("❌ У вас нет прав администратора", show_alert=True)
         return
     
     user_id = int(callback.data.split("_")[-1])
     
-    db.connect(reuse_if_open=True)
-    try:
-        user = User.get_by_id(user_id)
-    except:
+    with connection():
+        user = User.get_or_none(User.id == user_id)
+        reports = list(user.reports) if user else []
+    
+    if user is None:
         await callback.answer("❌ Пользователь не найден", show_alert=True)
-        db.close()
         return
     
-    reports = list(user.reports)
-    db.close()
-    
     reports_by_status = {}
     for report in reports:
         status = report.status
@@ -855,33 +850,23 @@ async def show_user_detail(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "back_to_users")
-async def back_to_users_list(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
+async def back_to_users_list(callback: CallbackQuery, is_admin: bool):
+    if not is_admin:
         await callback.answer("❌ У вас нет прав администратора", show_alert=True)
         return
     
-    db.connect(reuse_if_open=True)
-    users = list(User.select().order_by(User.rating.desc()))
-    db.close()
+    listing = users_list()
     
-    if not users:
+    if not listing:
         await callback.message.answer("👥 Нет пользователей")
         await callback.answer()
         return
     
-    total_pages = math.ceil(len(users) / ITEMS_PER_PAGE)
-    
-    keyboard = create_pagination_keyboard(
-        users, 
-        0, 
-        total_pages, 
-        "user",
-        lambda u: f"👤 @{u.username or 'Неизвестно'} | {u.reports_count} отчётов | {u.rating} ⭐"
-    )
+    total, total_pages, keyboard, _ = listing
     
     await callback.message.answer(
         f"👥 <b>Пользователи</b>\n\n"
-        f"Всего: {len(users)}\n"
+        f"Всего: {total}\n"
         f"Выберите пользователя:",
         parse_mode='HTML',
         reply_markup=keyboard
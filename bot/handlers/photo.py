@@ -1,18 +1,67 @@
 from aiogram import Router, F
-from aiogram.types import Message, Location, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, Location, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from bot.keyboards import location_keyboard, main_menu_keyboard, cancel_keyboard
-from bot.utils import extract_gps_from_image, create_report, get_coordinates_from_address
-from backend.services import gigachat_service
+from bot.keyboards import location_keyboard, main_menu_keyboard, cancel_keyboard, duplicate_report_keyboard
+from backend.services import storage, derivative_service
+from bot.utils import extract_gps_from_image, create_report, get_coordinates_from_address, analyze_image, AnalysisQueueFull, get_nearby_reports, attach_to_report
+import asyncio
 import os
-import uuid
 
 router = Router()
 
+def save_photo(image):
+    key = storage.save(image)
+    derivative_service.submit(key, image)
+    return key
+
 class ReportStates(StatesGroup):
     waiting_for_location = State()
     waiting_for_address = State()
+    waiting_for_duplicate_choice = State()
+
+async def finish_report(message: Message, state: FSMContext, user):
+    data = await state.get_data()
+    
+    result = await create_report(
+        user_id=user.id,
+        username=user.username,
+        first_name=user.first_name,
+        photo_path=data['photo_path'],
+        latitude=data['latitude'],
+        longitude=data['longitude'],
+        address=data.get('address'),
+        description=data['description'],
+        waste_type=data['waste_type'],
+        danger_level=data['danger_level'],
+        rating_points=data.get('rating_points', 10),
+        telegram_file_id=data.get('telegram_file_id')
+    )
+    
+    address_line = f"📍 Адрес: {data['address']}\n" if data.get('address') else ""
+    await message.answer(
+        f"✅ Отчёт #{result['id']} успешно отправлен!\n\n"
+        f"{address_line}"
+        f"Ваш рейтинг увеличен на {data.get('rating_points', 10)} баллов! ⭐️",
+        reply_markup=main_menu_keyboard()
+    )
+    await state.clear()
+
+async def submit_report(message: Message, state: FSMContext, user):
+    data = await state.get_data()
+    
+    nearby = await get_nearby_reports(data['latitude'], data['longitude'])
+    if not nearby:
+        await finish_report(message, state, user)
+        return
+    
+    report = nearby[0]
+    await state.set_state(ReportStates.waiting_for_duplicate_choice)
+    await message.answer(
+        f"📍 В {report['distance']:.0f} м уже есть открытый отчёт #{report['id']} ({report['waste_type']}).\n\n"
+        "Если это то же загрязнение, прикрепите фото к существующему отчёту.",
+        reply_markup=duplicate_report_keyboard(report['id'])
+    )
 
 @router.message(F.text == "📸 Отправить отчёт")
 async def start_report(message: Message, state: FSMContext):
@@ -50,17 +99,19 @@ async def process_photo(message: Message, state: FSMContext):
     file = await message.bot.get_file(file_id)
     file_path_in_bot = file.file_path
     
-    filename = f"{uuid.uuid4()}.jpg"
-    filepath = os.path.join("uploads", filename)
-    
-    await message.bot.download_file(file_path_in_bot, filepath)
+    # The photo stays in memory until it is accepted; rejected photos never touch the disk
+    buffer = await message.bot.download_file(file_path_in_bot)
+    image = buffer.getvalue()
     
     await message.answer("🤖 Анализирую изображение...")
     
-    analysis = gigachat_service.analyze_image(filepath)
+    try:
+        analysis = await analyze_image(image, message.from_user.id)
+    except AnalysisQueueFull:
+        await message.answer("⏳ Ваши предыдущие фото ещё анализируются. Подождите немного и отправьте снова.")
+        return
     
     if not analysis or not analysis.get('is_pollution'):
-        os.remove(filepath)
         await message.answer(
             "❌ На фото не обнаружено экологических загрязнений.\n\n"
             "Пожалуйста, отправьте фото со свалкой, мусором или другими загрязнениями.",
@@ -77,10 +128,14 @@ async def process_photo(message: Message, state: FSMContext):
         f"⭐️ За этот отчёт: +{analysis.get('rating_points', 10)} баллов"
     )
     
-    gps = extract_gps_from_image(filepath)
+    source = 'document' if message.document else 'photo'
+    gps = extract_gps_from_image(image, source)
+    filename = await asyncio.get_running_loop().run_in_executor(None, save_photo, image)
     
+    # Only photo file_ids can be re-sent with answer_photo; documents get one on the first admin view
     await state.update_data(
         photo_path=filename,
+        telegram_file_id=file_id if message.photo else None,
         description=analysis.get('description'),
         waste_type=analysis.get('waste_type'),
         danger_level=analysis.get('danger_level'),
@@ -93,33 +148,14 @@ async def process_photo(message: Message, state: FSMContext):
             longitude=gps['longitude']
         )
         
-        data = await state.get_data()
-        
-        result = await create_report(
-            user_id=message.from_user.id,
-            username=message.from_user.username,
-            first_name=message.from_user.first_name,
-            photo_path=data['photo_path'],
-            latitude=data['latitude'],
-            longitude=data['longitude'],
-            address=None,
-            description=data['description'],
-            waste_type=data['waste_type'],
-            danger_level=data['danger_level'],
-            rating_points=data.get('rating_points', 10)
-        )
-        
-        await message.answer(
-            f"✅ Отчёт #{result['id']} успешно отправлен!\n\n"
-            f"Ваш рейтинг увеличен на {data.get('rating_points', 10)} баллов! ⭐️",
-            reply_markup=main_menu_keyboard()
-        )
-        await state.clear()
+        await submit_report(message, state, message.from_user)
     else:
+        # Telegram strips EXIF from compressed photos, only files keep the coordinates
+        hint = "\n\n💡 Отправляйте фото как файл — тогда координаты определятся автоматически." if source == 'photo' else ""
         await state.set_state(ReportStates.waiting_for_location)
         await message.answer(
             "📍 Геолокация не найдена в метаданных фото.\n\n"
-            "Пожалуйста, отправьте геолокацию или введите адрес вручную.",
+            f"Пожалуйста, отправьте геолокацию или введите адрес вручную.{hint}",
             reply_markup=location_keyboard()
         )
 
@@ -132,28 +168,7 @@ async def process_location(message: Message, state: FSMContext):
         longitude=location.longitude
     )
     
-    data = await state.get_data()
-    
-    result = await create_report(
-        user_id=message.from_user.id,
-        username=message.from_user.username,
-        first_name=message.from_user.first_name,
-        photo_path=data['photo_path'],
-        latitude=data['latitude'],
-        longitude=data['longitude'],
-        address=None,
-        description=data['description'],
-        waste_type=data['waste_type'],
-        danger_level=data['danger_level'],
-        rating_points=data.get('rating_points', 10)
-    )
-    
-    await message.answer(
-        f"✅ Отчёт #{result['id']} успешно отправлен!\n\n"
-        f"Ваш рейтинг увеличен на {data.get('rating_points', 10)} баллов! ⭐️",
-        reply_markup=main_menu_keyboard()
-    )
-    await state.clear()
+    await submit_report(message, state, message.from_user)
 
 @router.message(ReportStates.waiting_for_location, F.text == "✍️ Ввести адрес вручную")
 async def ask_for_address(message: Message, state: FSMContext):
@@ -187,29 +202,44 @@ async def process_address(message: Message, state: FSMContext):
         longitude=coords['longitude']
     )
     
+    await submit_report(message, state, message.from_user)
+
+@router.callback_query(ReportStates.waiting_for_duplicate_choice, F.data.startswith("duplicate_attach_"))
+async def attach_duplicate(callback: CallbackQuery, state: FSMContext):
+    report_id = int(callback.data.split("_")[-1])
     data = await state.get_data()
     
-    result = await create_report(
-        user_id=message.from_user.id,
-        username=message.from_user.username,
-        first_name=message.from_user.first_name,
-        photo_path=data['photo_path'],
-        latitude=data['latitude'],
-        longitude=data['longitude'],
-        address=data['address'],
-        description=data['description'],
-        waste_type=data['waste_type'],
-        danger_level=data['danger_level'],
-        rating_points=data.get('rating_points', 10)
+    status, _ = await attach_to_report(
+        report_id,
+        user_id=callback.from_user.id,
+        username=callback.from_user.username,
+        first_name=callback.from_user.first_name,
+        photo_path=data['photo_path']
     )
     
-    await message.answer(
-        f"✅ Отчёт #{result['id']} успешно отправлен!\n\n"
-        f"📍 Адрес: {address}\n"
-        f"Ваш рейтинг увеличен на {data.get('rating_points', 10)} баллов! ⭐️",
-        reply_markup=main_menu_keyboard()
-    )
-    await state.clear()
+    if status not in (201, 404):
+        # Keep the buttons so the user can try again or file a new report
+        await callback.answer("❌ Не удалось прикрепить фото, попробуйте ещё раз", show_alert=True)
+        return
+    
+    await callback.message.edit_reply_markup(reply_markup=None)
+    
+    if status == 404:
+        await callback.message.answer("ℹ️ Этот отчёт уже закрыт, создаю новый.")
+        await finish_report(callback.message, state, callback.from_user)
+    else:
+        await callback.message.answer(
+            f"📌 Фото прикреплено к отчёту #{report_id}. Спасибо, это поможет быстрее устранить загрязнение!",
+            reply_markup=main_menu_keyboard()
+        )
+        await state.clear()
+    await callback.answer()
+
+@router.callback_query(ReportStates.waiting_for_duplicate_choice, F.data == "duplicate_new")
+async def create_duplicate(callback: CallbackQuery, state: FSMContext):
+    await callback.message.edit_reply_markup(reply_markup=None)
+    await finish_report(callback.message, state, callback.from_user)
+    await callback.answer()
 
 @router.message(F.text == "🗺 Карта загрязнений")
 async def show_map(message: Message):
@@ -3,8 +3,7 @@ from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from bot.keyboards import main_menu_keyboard
-import aiohttp
-import os
+from bot.utils import create_review
 
 router = Router()
 
@@ -28,26 +27,24 @@ async def start_review(message: Message, state: FSMContext):
 async def process_review(message: Message, state: FSMContext):
     review_text = message.text
 
-    backend_url = os.getenv('BACKEND_URL', 'http://localhost:5000')
-
-    async with aiohttp.ClientSession() as session:
-        async with session.post(f'{backend_url}/api/reviews', json={
-            'user_id': message.from_user.id,
-            'username': message.from_user.username,
-            'first_name': message.from_user.first_name,
-            'text': review_text,
-            'rating': 5
-        }) as response:
-            if response.status == 201:
-                await message.answer(
-                    "✅ Спасибо за ваш отзыв!\n\n"
-                    "Ваш отзыв появится на нашем сайте.",
-                    reply_markup=main_menu_keyboard()
-                )
-            else:
-                await message.answer(
-                    "❌ Ошибка при отправке отзыва. Попробуйте позже.",
-                    reply_markup=main_menu_keyboard()
-                )
+    review = await create_review(
+        user_id=message.from_user.id,
+        username=message.from_user.username,
+        first_name=message.from_user.first_name,
+        text=review_text,
+        rating=5
+    )
+
+    if review:
+        await message.answer(
+            "✅ Спасибо за ваш отзыв!\n\n"
+            "Ваш отзыв появится на нашем сайте.",
+            reply_markup=main_menu_keyboard()
+        )
+    else:
+        await message.answer(
+            "❌ Ошибка при отправке отзыва. Попробуйте позже.",
+            reply_markup=main_menu_keyboard()
+        )
 
     await state.clear()
\ No newline at end of file
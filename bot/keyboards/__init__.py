@@ -4,6 +4,7 @@ from .inline import (
     location_keyboard,
     cancel_keyboard,
     report_status_keyboard,
+    duplicate_report_keyboard,
     pagination_keyboard,
     cancel_admin_keyboard
 )
@@ -14,6 +15,7 @@ __all__ = [
     'location_keyboard',
     'cancel_keyboard',
     'report_status_keyboard',
+    'duplicate_report_keyboard',
     'pagination_keyboard',
     'cancel_admin_keyboard'
 ]
@@ -74,6 +74,15 @@ def report_status_keyboard(report_id):
     )
     return keyboard
 
+def duplicate_report_keyboard(report_id):
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=f"📌 Прикрепить к отчёту #{report_id}", callback_data=f"duplicate_attach_{report_id}")],
+            [InlineKeyboardButton(text="➕ Создать новый отчёт", callback_data="duplicate_new")]
+        ]
+    )
+    return keyboard
+
 def pagination_keyboard(page, total_pages, prefix):
     buttons = []
     
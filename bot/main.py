@@ -6,14 +6,31 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
 
 from bot.handlers import start, stats, photo, admin, review
-from bot.middlewares import UserMiddleware
-from database import initialize_db
+from bot.middlewares import UserMiddleware, AdminMiddleware, admin_cache, user_store
+from bot.utils import api_client, get_gps_metrics
+from backend.services import gigachat_service, derivative_service
+from database import db, initialize_db
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+async def on_startup():
+    await api_client.init_session()
+    admin_cache.load()
+    user_store.start()
+
+async def on_shutdown():
+    await user_store.stop()
+    logger.info("Backend API client metrics: %s", api_client.get_metrics())
+    logger.info("GigaChat metrics: %s", gigachat_service.get_metrics())
+    logger.info("Database metrics: %s", db.get_metrics())
+    logger.info("GPS extraction metrics: %s", get_gps_metrics())
+    await api_client.close_session()
+    gigachat_service.close()
+    derivative_service.close()
+
 async def main():
     initialize_db()
     
@@ -25,7 +42,12 @@ async def main():
     bot = Bot(token=bot_token)
     dp = Dispatcher(storage=MemoryStorage())
     
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    
     dp.message.middleware(UserMiddleware())
+    dp.message.middleware(AdminMiddleware())
+    dp.callback_query.middleware(AdminMiddleware())
     
     dp.include_router(start.router)
     dp.include_router(stats.router)
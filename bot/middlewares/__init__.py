@@ -1,3 +1,4 @@
-from .user_middleware import UserMiddleware
+from .user_middleware import UserMiddleware, user_store
+from .admin_middleware import AdminMiddleware, admin_cache
 
-__all__ = ['UserMiddleware']
+__all__ = ['UserMiddleware', 'user_store', 'AdminMiddleware', 'admin_cache']
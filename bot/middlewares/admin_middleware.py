@@ -0,0 +1,36 @@
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from database import Admin, connection
+
+class AdminCache:
+    def __init__(self):
+        self.admin_ids = None
+    
+    def load(self):
+        with connection():
+            query = Admin.select(Admin.telegram_id).where(Admin.is_active == True)
+            self.admin_ids = {admin.telegram_id for admin in query}
+    
+    def add(self, telegram_id):
+        if self.admin_ids is None:
+            self.load()
+        self.admin_ids.add(telegram_id)
+    
+    def is_admin(self, telegram_id):
+        if self.admin_ids is None:
+            self.load()
+        return telegram_id in self.admin_ids
+
+admin_cache = AdminCache()
+
+class AdminMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        data['is_admin'] = bool(user) and admin_cache.is_admin(user.id)
+        return await handler(event, data)
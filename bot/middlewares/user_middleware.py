@@ -1,9 +1,108 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import Message
-from database import User, db
+from database import User, connection
+
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+USER_FLUSH_INTERVAL = float(os.getenv('USER_FLUSH_INTERVAL', 5))
+
+logger = logging.getLogger(__name__)
+
+class UserStore:
+    def __init__(self, max_size, flush_interval):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.cache = OrderedDict()
+        self.dirty = {}
+        # A single thread keeps SQLite access off the event loop and serializes our writes
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='user-store')
+        self.flush_task = None
+    
+    async def run_db(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+    
+    def select(self, telegram_id):
+        # Rating and counters are owned by the backend, so only identity columns are cached
+        return User.select(User.id, User.telegram_id, User.username, User.first_name).where(User.telegram_id == telegram_id)
+    
+    def load(self, user):
+        with connection():
+            db_user = self.select(user.id).first()
+            if db_user is None:
+                # New users are inserted right away so the API and handlers can see them
+                User.insert(
+                    telegram_id=user.id, username=user.username, first_name=user.first_name
+                ).on_conflict_ignore().execute()
+                db_user = self.select(user.id).first()
+            return db_user
+    
+    def write(self, users):
+        with connection():
+            User.bulk_update(users, fields=[User.username, User.first_name], batch_size=100)
+    
+    def remember(self, telegram_id, db_user):
+        self.cache[telegram_id] = db_user
+        self.cache.move_to_end(telegram_id)
+        # Unflushed users stay in self.dirty, so evicting them loses nothing
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+    
+    async def get(self, user):
+        db_user = self.cache.get(user.id)
+        
+        if db_user is None:
+            loaded = await self.run_db(self.load, user)
+            db_user = self.cache.get(user.id) or loaded
+        
+        # Only name changes are written behind
+        if db_user.username != user.username or db_user.first_name != user.first_name:
+            db_user.username = user.username
+            db_user.first_name = user.first_name
+            self.dirty[user.id] = db_user
+        
+        self.remember(user.id, db_user)
+        return db_user
+    
+    async def flush(self):
+        if not self.dirty:
+            return
+        
+        users = list(self.dirty.values())
+        self.dirty = {}
+        try:
+            await self.run_db(self.write, users)
+        except Exception:
+            logger.exception("Failed to flush %s users", len(users))
+            for u in users:
+                self.dirty.setdefault(u.telegram_id, u)
+    
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+    
+    def start(self):
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_loop())
+    
+    async def stop(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        await self.flush()
+
+user_store = UserStore(max_size=USER_CACHE_SIZE, flush_interval=USER_FLUSH_INTERVAL)
 
 class UserMiddleware(BaseMiddleware):
+    def __init__(self, store=None):
+        self.store = store or user_store
+    
     async def __call__(
         self,
         handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
@@ -13,17 +112,6 @@ class UserMiddleware(BaseMiddleware):
         user = event.from_user
         
         if user:
-            db.connect(reuse_if_open=True)
-            try:
-                db_user = User.get(User.telegram_id == user.id)
-            except User.DoesNotExist:
-                db_user = User.create(
-                    telegram_id=user.id,
-                    username=user.username,
-                    first_name=user.first_name
-                )
-            
-            data['db_user'] = db_user
-            db.close()
+            data['db_user'] = await self.store.get(user)
         
         return await handler(event, data)
@@ -1,4 +1,5 @@
-from .exif import extract_gps_from_image
-from .api_client import create_report, get_user_stats, get_reports, update_report_status, delete_report, get_coordinates_from_address
+from .exif import extract_gps_from_image, get_gps_metrics
+from .analysis import analyze_image, AnalysisQueueFull
+from .api_client import init_session, close_session, create_report, get_user_stats, get_stats, get_reports, get_reports_page, get_report, set_report_file_id, get_nearby_reports, attach_to_report, update_report_status, delete_report, create_review, delete_review, get_coordinates_from_address
 
-__all__ = ['extract_gps_from_image', 'create_report', 'get_user_stats', 'get_reports', 'update_report_status', 'delete_report', 'get_coordinates_from_address']
+__all__ = ['extract_gps_from_image', 'get_gps_metrics', 'analyze_image', 'AnalysisQueueFull', 'init_session', 'close_session', 'create_report', 'get_user_stats', 'get_stats', 'get_reports', 'get_reports_page', 'get_report', 'set_report_file_id', 'get_nearby_reports', 'attach_to_report', 'update_report_status', 'delete_report', 'create_review', 'delete_review', 'get_coordinates_from_address']
@@ -0,0 +1,84 @@
+import asyncio
+import os
+from functools import partial
+from backend.services import gigachat_service
+
+ANALYSIS_USER_QUEUE_LIMIT = int(os.getenv('ANALYSIS_USER_QUEUE_LIMIT', 3))
+ANALYSIS_BATCH_WINDOW = float(os.getenv('ANALYSIS_BATCH_WINDOW', 0.2))
+ANALYSIS_BATCH_SIZE = int(os.getenv('ANALYSIS_BATCH_SIZE', 32))
+
+_user_queues = {}
+
+
+class AnalysisQueueFull(Exception):
+    pass
+
+
+class AnalysisBatcher:
+    def __init__(self, window, max_batch):
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = []
+        self.flush_handle = None
+
+    async def submit(self, image):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((image, future))
+        
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.window, self.flush)
+        
+        return await future
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.ensure_future(self.run(batch))
+
+    async def run(self, batch):
+        loop = asyncio.get_running_loop()
+        images = [image for image, _ in batch]
+        
+        try:
+            results = await loop.run_in_executor(
+                None, partial(gigachat_service.analyze_images, images, return_exceptions=True)
+            )
+        except Exception as e:
+            results = [e] * len(batch)
+        
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+batcher = AnalysisBatcher(window=ANALYSIS_BATCH_WINDOW, max_batch=ANALYSIS_BATCH_SIZE)
+
+
+async def analyze_image(image, user_id):
+    queue = _user_queues.get(user_id)
+    if queue is None:
+        queue = _user_queues[user_id] = {'lock': asyncio.Lock(), 'pending': 0}
+    
+    if queue['pending'] >= ANALYSIS_USER_QUEUE_LIMIT:
+        raise AnalysisQueueFull()
+    
+    queue['pending'] += 1
+    try:
+        # One photo per user at a time; photos from different users are coalesced into batches
+        async with queue['lock']:
+            return await batcher.submit(image)
+    finally:
+        queue['pending'] -= 1
+        if not queue['pending']:
+            _user_queues.pop(user_id, None)
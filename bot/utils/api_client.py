@@ -1,3 +1,5 @@
+import asyncio
+import logging
 import os
 import aiohttp
 from dotenv import load_dotenv
@@ -5,64 +7,225 @@ from dotenv import load_dotenv
 load_dotenv()
 
 BACKEND_URL = os.getenv('BACKEND_URL', 'http://localhost:5000')
+API_POOL_SIZE = int(os.getenv('API_POOL_SIZE', 20))
+API_TIMEOUT = float(os.getenv('API_TIMEOUT', 10))
+API_RETRIES = int(os.getenv('API_RETRIES', 2))
 
-async def create_report(user_id, username, first_name, photo_path, latitude, longitude, address, description, waste_type, danger_level, rating_points=10):
-    async with aiohttp.ClientSession() as session:
-        data = {
-            'user_id': user_id,
-            'username': username,
-            'first_name': first_name,
-            'photo_path': photo_path,
-            'latitude': latitude,
-            'longitude': longitude,
-            'address': address,
-            'description': description,
-            'waste_type': waste_type,
-            'danger_level': danger_level,
-            'rating_points': rating_points
-        }
-        
-        async with session.post(f'{BACKEND_URL}/api/reports', json=data) as response:
-            return await response.json()
+IDEMPOTENT_METHODS = {'GET', 'PUT', 'DELETE'}
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_metrics = {
+    'requests': 0,
+    'retries': 0,
+    'failures': 0,
+    'in_flight': 0,
+    'max_in_flight': 0,
+    'saturated': 0
+}
+
+async def init_session():
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=API_POOL_SIZE,
+            limit_per_host=API_POOL_SIZE,
+            keepalive_timeout=30,
+            ttl_dns_cache=300
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=API_TIMEOUT)
+        )
+    return _session
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+def get_metrics():
+    return dict(_metrics)
+
+async def request(method, url, timeout=None, include_headers=False, retry=True, **kwargs):
+    session = await init_session()
+    attempts = API_RETRIES + 1 if retry and method in IDEMPOTENT_METHODS else 1
+    if timeout is not None:
+        kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+    
+    _metrics['requests'] += 1
+    _metrics['in_flight'] += 1
+    _metrics['max_in_flight'] = max(_metrics['max_in_flight'], _metrics['in_flight'])
+    # More requests in flight than pooled connections means callers are queueing for a socket
+    if _metrics['in_flight'] > API_POOL_SIZE:
+        _metrics['saturated'] += 1
+    
+    try:
+        for attempt in range(attempts):
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    if response.status >= 500 and attempt < attempts - 1:
+                        raise aiohttp.ClientResponseError(response.request_info, response.history, status=response.status)
+                    
+                    data = None
+                    if response.content_type == 'application/json':
+                        data = await response.json()
+                    if include_headers:
+                        return response.status, data, response.headers
+                    return response.status, data
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == attempts - 1:
+                    _metrics['failures'] += 1
+                    raise
+                _metrics['retries'] += 1
+                logger.warning("Retrying %s %s after error: %s", method, url, e)
+                await asyncio.sleep(0.3 * 2 ** attempt)
+    finally:
+        _metrics['in_flight'] -= 1
+
+async def create_report(user_id, username, first_name, photo_path, latitude, longitude, address, description, waste_type, danger_level, rating_points=10, telegram_file_id=None):
+    data = {
+        'user_id': user_id,
+        'username': username,
+        'first_name': first_name,
+        'photo_path': photo_path,
+        'telegram_file_id': telegram_file_id,
+        'latitude': latitude,
+        'longitude': longitude,
+        'address': address,
+        'description': description,
+        'waste_type': waste_type,
+        'danger_level': danger_level,
+        'rating_points': rating_points
+    }
+    
+    status, result = await request('POST', f'{BACKEND_URL}/api/reports', json=data)
+    return result
 
 async def get_user_stats(telegram_id):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f'{BACKEND_URL}/api/user/{telegram_id}/stats') as response:
-            if response.status == 200:
-                return await response.json()
-            return None
-
-async def get_reports(status=None, waste_type=None, danger_level=None):
-    async with aiohttp.ClientSession() as session:
-        params = {}
-        if status:
-            params['status'] = status
-        if waste_type:
-            params['waste_type'] = waste_type
-        if danger_level:
-            params['danger_level'] = danger_level
-        
-        async with session.get(f'{BACKEND_URL}/api/reports', params=params) as response:
-            return await response.json()
+    status, data = await request('GET', f'{BACKEND_URL}/api/user/{telegram_id}/stats')
+    if status == 200:
+        return data
+    return None
+
+async def get_stats():
+    status, data = await request('GET', f'{BACKEND_URL}/api/stats')
+    if status == 200:
+        return data
+    return None
+
+async def get_reports(status=None, waste_type=None, danger_level=None, exclude_status=None, limit=None, cursor=None):
+    params = {}
+    if status:
+        params['status'] = status
+    if exclude_status:
+        params['exclude_status'] = exclude_status
+    if waste_type:
+        params['waste_type'] = waste_type
+    if danger_level:
+        params['danger_level'] = danger_level
+    if limit:
+        params['limit'] = limit
+    if cursor:
+        params['cursor'] = cursor
+    
+    response_status, data = await request('GET', f'{BACKEND_URL}/api/reports', params=params)
+    return data
+
+async def get_reports_page(status=None, exclude_status=None, after_id=None, before_id=None, limit=10, fields=None):
+    params = {'limit': limit, 'with_total': 1}
+    if status:
+        params['status'] = status
+    if exclude_status:
+        params['exclude_status'] = exclude_status
+    if after_id:
+        params['after_id'] = after_id
+    if before_id:
+        params['before_id'] = before_id
+    if fields:
+        params['fields'] = ','.join(fields)
+    
+    response_status, data, headers = await request('GET', f'{BACKEND_URL}/api/reports', include_headers=True, params=params)
+    # 410: the anchor report was deleted, the caller has to start from the first page
+    if response_status == 410:
+        return None
+    if response_status != 200:
+        return [], 0
+    return data, int(headers.get('X-Total-Count', len(data)))
+
+async def get_report(report_id, fields=None):
+    params = {}
+    if fields:
+        params['fields'] = ','.join(fields)
+    
+    status, data = await request('GET', f'{BACKEND_URL}/api/reports/{report_id}', params=params)
+    if status == 200:
+        return data
+    return None
+
+async def set_report_file_id(report_id, telegram_file_id):
+    status, data = await request(
+        'PUT', f'{BACKEND_URL}/api/reports/{report_id}/photo', json={'telegram_file_id': telegram_file_id}
+    )
+    return status == 200
 
 async def update_report_status(report_id, status, changed_by, comment=None):
-    async with aiohttp.ClientSession() as session:
-        data = {
-            'status': status,
-            'changed_by': changed_by,
-            'comment': comment
-        }
-        
-        async with session.put(f'{BACKEND_URL}/api/reports/{report_id}', json=data) as response:
-            return await response.json()
+    data = {
+        'status': status,
+        'changed_by': changed_by,
+        'comment': comment
+    }
+    
+    # Every status PUT appends a history row, so a retry after a lost response would duplicate it
+    response_status, result = await request('PUT', f'{BACKEND_URL}/api/reports/{report_id}', json=data, retry=False)
+    return result
 
 async def delete_report(report_id):
-    async with aiohttp.ClientSession() as session:
-        async with session.delete(f'{BACKEND_URL}/api/reports/{report_id}') as response:
-            return await response.json()
+    status, data = await request('DELETE', f'{BACKEND_URL}/api/reports/{report_id}')
+    return data
+
+async def get_nearby_reports(latitude, longitude, radius=None):
+    params = {'lat': latitude, 'lon': longitude}
+    if radius:
+        params['radius'] = radius
+    
+    status, data = await request('GET', f'{BACKEND_URL}/api/reports/nearby', params=params)
+    if status == 200:
+        return data
+    return []
+
+async def attach_to_report(report_id, user_id, username, first_name, photo_path):
+    data = {
+        'user_id': user_id,
+        'username': username,
+        'first_name': first_name,
+        'photo_path': photo_path
+    }
+    
+    # The caller needs the status: only 404 means the report was closed meanwhile
+    return await request('POST', f'{BACKEND_URL}/api/reports/{report_id}/attach', json=data)
+
+async def create_review(user_id, username, first_name, text, rating=5):
+    data = {
+        'user_id': user_id,
+        'username': username,
+        'first_name': first_name,
+        'text': text,
+        'rating': rating
+    }
+    
+    status, result = await request('POST', f'{BACKEND_URL}/api/reviews', json=data)
+    if status == 201:
+        return result
+    return None
+
+async def delete_review(review_id):
+    status, data = await request('DELETE', f'{BACKEND_URL}/api/reviews/{review_id}')
+    return status == 200
 
 async def get_coordinates_from_address(address):
-    import os
     api_key = os.getenv('YANDEX_MAP_API_KEY')
     
     if not api_key:
@@ -76,20 +239,17 @@ async def get_coordinates_from_address(address):
         'format': 'json'
     }
     
-    async with aiohttp.ClientSession() as session:
-        async with session.get(geocode_url, params=params) as response:
-            if response.status != 200:
-                return None
-            
-            data = await response.json()
-            
-            try:
-                geo_object = data['response']['GeoObjectCollection']['featureMember'][0]['GeoObject']
-                pos = geo_object['Point']['pos'].split()
-                
-                return {
-                    'latitude': float(pos[1]),
-                    'longitude': float(pos[0])
-                }
-            except:
-                return None
+    status, data = await request('GET', geocode_url, params=params)
+    if status != 200:
+        return None
+    
+    try:
+        geo_object = data['response']['GeoObjectCollection']['featureMember'][0]['GeoObject']
+        pos = geo_object['Point']['pos'].split()
+        
+        return {
+            'latitude': float(pos[1]),
+            'longitude': float(pos[0])
+        }
+    except:
+        return None
@@ -1,35 +1,89 @@
+import io
+import struct
 from PIL import Image
-from PIL.ExifTags import TAGS, GPSTAGS
+from PIL.ExifTags import GPSTAGS
 
-def extract_gps_from_image(image_path):
+GPS_IFD = 0x8825
+
+_metrics = {}
+
+def _record(source, outcome):
+    counts = _metrics.setdefault(source, {'gps': 0, 'no_gps': 0, 'no_exif': 0})
+    counts[outcome] += 1
+
+def get_gps_metrics():
+    metrics = {}
+    for source, counts in _metrics.items():
+        total = sum(counts.values())
+        metrics[source] = dict(counts, total=total, success_rate=counts['gps'] / total if total else 0.0)
+    return metrics
+
+def read_app1(data):
+    if data[:2] != b'\xff\xd8':
+        return None
+    
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            offset += 1
+            continue
+        # Start of scan: image data follows and there is no EXIF before it
+        if marker == 0xDA:
+            return None
+        length = struct.unpack('>H', data[offset + 2:offset + 4])[0]
+        segment = data[offset + 4:offset + 2 + length]
+        if marker == 0xE1 and segment.startswith(b'Exif\x00\x00'):
+            return segment
+        offset += 2 + length
+    return None
+
+def read_exif(source):
+    if isinstance(source, bytes):
+        # Fast path for JPEG: parse the APP1 segment without opening the image
+        if source[:2] == b'\xff\xd8':
+            segment = read_app1(source)
+            if segment is None:
+                return None
+            exif = Image.Exif()
+            exif.load(segment)
+            return exif
+        source = io.BytesIO(source)
+    
+    # Other formats: Image.open still reads only the headers
+    with Image.open(source) as image:
+        return image.getexif()
+
+def extract_gps_from_image(source, kind='file'):
     try:
-        image = Image.open(image_path)
-        exif_data = image.getexif()
+        exif_data = read_exif(source)
         
         if not exif_data:
+            _record(kind, 'no_exif')
             return None
         
         gps_info = {}
-        for tag, value in exif_data.items():
-            tag_name = TAGS.get(tag, tag)
-            if tag_name == 'GPSInfo':
-                for gps_tag in value:
-                    gps_tag_name = GPSTAGS.get(gps_tag, gps_tag)
-                    gps_info[gps_tag_name] = value[gps_tag]
-        
-        if not gps_info:
-            return None
+        for tag, value in exif_data.get_ifd(GPS_IFD).items():
+            gps_info[GPSTAGS.get(tag, tag)] = value
         
         lat = convert_to_degrees(gps_info.get('GPSLatitude'))
         lon = convert_to_degrees(gps_info.get('GPSLongitude'))
         
+        if lat is None or lon is None:
+            _record(kind, 'no_gps')
+            return None
+        
         if gps_info.get('GPSLatitudeRef') == 'S':
             lat = -lat
         if gps_info.get('GPSLongitudeRef') == 'W':
             lon = -lon
         
+        _record(kind, 'gps')
         return {'latitude': lat, 'longitude': lon}
     except Exception as e:
+        _record(kind, 'no_exif')
         return None
 
 def convert_to_degrees(value):
@@ -1,4 +1,4 @@
-from .db import db, initialize_db
-from .models import User, Report, ReportHistory, Admin, Review
+from .db import db, initialize_db, connection
+from .models import User, Report, ReportHistory, Admin, Review, ReportStats, UserReportStats, AnalysisCache
 
-__all__ = ['db', 'initialize_db', 'User', 'Report', 'ReportHistory', 'Admin', 'Review']
+__all__ = ['db', 'initialize_db', 'connection', 'User', 'Report', 'ReportHistory', 'Admin', 'Review', 'ReportStats', 'UserReportStats', 'AnalysisCache']
@@ -0,0 +1,194 @@
+import math
+import os
+import threading
+import time
+from .models import Report
+
+MAX_ZOOM = 19
+# Four cells per 256px tile, the same density as the old 64px client-side gridSize
+CELLS_PER_TILE = 4
+
+
+def cell_size(zoom):
+    return 360 / (2 ** zoom * CELLS_PER_TILE)
+
+
+class ReportClusters:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.points = None
+        self.loaded_at = None
+        self.generation = 0
+        self.grids = {}
+
+    def invalidate(self):
+        with self.lock:
+            self.points = None
+            self.grids = {}
+            self.generation += 1
+
+    def load_points(self):
+        query = Report.select(
+            Report.id, Report.latitude, Report.longitude, Report.status, Report.waste_type, Report.danger_level
+        )
+        return list(query.tuples().iterator())
+
+    def matching(self, points, filters, bbox=None):
+        statuses, waste_type, danger_level = filters
+        for point in points:
+            _, latitude, longitude, status, report_waste_type, report_danger_level = point
+            if statuses and status not in statuses:
+                continue
+            if waste_type and report_waste_type != waste_type:
+                continue
+            if danger_level and report_danger_level != danger_level:
+                continue
+            if bbox and not (bbox[0] <= latitude <= bbox[2] and bbox[1] <= longitude <= bbox[3]):
+                continue
+            yield point
+
+    def build(self, points, zoom, filters):
+        size = cell_size(zoom)
+        cells = {}
+        for report_id, latitude, longitude, status, report_waste_type, report_danger_level in self.matching(points, filters):
+            key = (math.floor(latitude / size), math.floor(longitude / size))
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = {
+                    'id': report_id,
+                    'waste_type': report_waste_type,
+                    'count': 0,
+                    'latitude': 0.0,
+                    'longitude': 0.0,
+                    'bbox': [latitude, longitude, latitude, longitude],
+                    'by_status': {},
+                    'by_danger': {}
+                }
+            cell['count'] += 1
+            cell['latitude'] += latitude
+            cell['longitude'] += longitude
+            bbox = cell['bbox']
+            bbox[0], bbox[1] = min(bbox[0], latitude), min(bbox[1], longitude)
+            bbox[2], bbox[3] = max(bbox[2], latitude), max(bbox[3], longitude)
+            cell['by_status'][status] = cell['by_status'].get(status, 0) + 1
+            cell['by_danger'][report_danger_level] = cell['by_danger'].get(report_danger_level, 0) + 1
+        return cells
+
+    def snapshot(self):
+        with self.lock:
+            if self.loaded_at is not None and time.monotonic() - self.loaded_at > self.ttl:
+                self.points = None
+                self.grids = {}
+            return self.points, self.generation
+
+    def store(self, generation, points, key=None, grid=None):
+        # Drop the result if a report changed while we were building it
+        with self.lock:
+            if generation != self.generation:
+                return
+            if self.points is None:
+                self.points = points
+                self.loaded_at = time.monotonic()
+            if key is not None:
+                self.grids[key] = grid
+
+    def get_points(self):
+        points, generation = self.snapshot()
+        if points is None:
+            points = self.load_points()
+            self.store(generation, points)
+        return points
+
+    def grid(self, zoom, filters):
+        key = (zoom, filters)
+        points, generation = self.snapshot()
+        with self.lock:
+            grid = self.grids.get(key)
+        if grid is not None:
+            return grid
+
+        if points is None:
+            points = self.load_points()
+        grid = self.build(points, zoom, filters)
+        self.store(generation, points, key, grid)
+        return grid
+
+    def cells_in(self, grid, zoom, bbox):
+        if bbox is None:
+            return list(grid.items())
+        size = cell_size(zoom)
+        min_lat, min_lon, max_lat, max_lon = bbox
+        min_i, min_j = math.floor(min_lat / size), math.floor(min_lon / size)
+        max_i, max_j = math.floor(max_lat / size), math.floor(max_lon / size)
+
+        if (max_i - min_i + 1) * (max_j - min_j + 1) < len(grid):
+            return [((i, j), grid[(i, j)])
+                    for i in range(min_i, max_i + 1)
+                    for j in range(min_j, max_j + 1)
+                    if (i, j) in grid]
+        return [(key, cell) for key, cell in grid.items()
+                if min_i <= key[0] <= max_i and min_j <= key[1] <= max_j]
+
+    def features(self, zoom, bbox, filters):
+        grid = self.grid(zoom, filters)
+        features = []
+        for (i, j), cell in self.cells_in(grid, zoom, bbox):
+            if cell['count'] == 1:
+                # Balloon text is fetched by the map when the marker is opened
+                features.append({
+                    'type': 'Feature',
+                    'id': cell['id'],
+                    'geometry': {'type': 'Point', 'coordinates': [cell['latitude'], cell['longitude']]},
+                    'properties': {
+                        'id': cell['id'],
+                        'status': next(iter(cell['by_status'])),
+                        'danger_level': next(iter(cell['by_danger'])),
+                        'waste_type': cell['waste_type']
+                    }
+                })
+                continue
+            min_lat, min_lon, max_lat, max_lon = cell['bbox']
+            features.append({
+                'type': 'Cluster',
+                'id': f"cluster_{zoom}_{i}_{j}",
+                'number': cell['count'],
+                'bbox': [[min_lat, min_lon], [max_lat, max_lon]],
+                'geometry': {
+                    'type': 'Point',
+                    'coordinates': [cell['latitude'] / cell['count'], cell['longitude'] / cell['count']]
+                },
+                'properties': {
+                    'iconContent': cell['count'],
+                    'by_status': cell['by_status'],
+                    'by_danger': cell['by_danger']
+                }
+            })
+        return features
+
+    def columns(self, bbox, filters):
+        statuses = []
+        danger_levels = []
+        status_codes = {}
+        danger_codes = {}
+        columns = {'id': [], 'lat': [], 'lon': [], 'status': [], 'danger': []}
+
+        for report_id, latitude, longitude, status, _, danger_level in self.matching(self.get_points(), filters, bbox):
+            if status not in status_codes:
+                status_codes[status] = len(statuses)
+                statuses.append(status)
+            if danger_level not in danger_codes:
+                danger_codes[danger_level] = len(danger_levels)
+                danger_levels.append(danger_level)
+            columns['id'].append(report_id)
+            columns['lat'].append(round(latitude, 6))
+            columns['lon'].append(round(longitude, 6))
+            columns['status'].append(status_codes[status])
+            columns['danger'].append(danger_codes[danger_level])
+
+        columns['statuses'] = statuses
+        columns['danger_levels'] = danger_levels
+        return columns
+
+
+report_clusters = ReportClusters(ttl=int(os.getenv('CLUSTER_CACHE_TTL', 60)))
@@ -1,15 +1,124 @@
 import os
-from peewee import SqliteDatabase
+import threading
+import time
+from contextlib import contextmanager
+from peewee import OperationalError
+from playhouse.db_url import parse
+from playhouse.pool import PooledSqliteDatabase, PooledPostgresqlDatabase
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_PATH = os.getenv('DATABASE_PATH', 'eco_monitoring.db')
+DATABASE_URL = os.getenv('DATABASE_URL', f'sqlite:///{DATABASE_PATH}')
+# Adds a PostGIS point column to report; requires the postgis extension
+DATABASE_POSTGIS = os.getenv('DATABASE_POSTGIS', '').lower() in ('1', 'true', 'yes')
+DATABASE_MAX_CONNECTIONS = int(os.getenv('DATABASE_MAX_CONNECTIONS', 20))
+DATABASE_STALE_TIMEOUT = int(os.getenv('DATABASE_STALE_TIMEOUT', 300))
+DATABASE_POOL_TIMEOUT = int(os.getenv('DATABASE_POOL_TIMEOUT', 10))
+DATABASE_BUSY_TIMEOUT = int(os.getenv('DATABASE_BUSY_TIMEOUT', 5000))
+# Statements slower than this are counted as slow; SQLite does not report how long it waited on a lock
+SLOW_STATEMENT_THRESHOLD = float(os.getenv('DATABASE_SLOW_STATEMENT_THRESHOLD', 0.05))
 
-db = SqliteDatabase(DATABASE_PATH)
+PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': DATABASE_BUSY_TIMEOUT,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+}
+
+class MonitoredDatabaseMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'checkouts': 0,
+            'statements': 0,
+            'slow_statements': 0,
+            'slow_statement_seconds': 0.0,
+            'lock_errors': 0,
+        }
+    
+    def _record(self, **values):
+        with self._metrics_lock:
+            for key, value in values.items():
+                self._metrics[key] += value
+    
+    def connect(self, reuse_if_open=False):
+        # True means a connection was checked out of the pool (reused or new), False an already open one
+        opened = super().connect(reuse_if_open)
+        if opened:
+            self._record(checkouts=1)
+        return opened
+    
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().execute_sql(sql, params, *args, **kwargs)
+        except OperationalError as e:
+            if 'locked' in str(e):
+                self._record(lock_errors=1)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            if elapsed > SLOW_STATEMENT_THRESHOLD:
+                self._record(statements=1, slow_statements=1, slow_statement_seconds=elapsed)
+            else:
+                self._record(statements=1)
+    
+    def get_metrics(self):
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics['pool_in_use'] = len(self._in_use)
+        metrics['pool_idle'] = len(self._connections)
+        return metrics
+
+class MonitoredSqliteDatabase(MonitoredDatabaseMixin, PooledSqliteDatabase):
+    def atomic(self, lock_type='IMMEDIATE'):
+        # Take the write lock up front: a deferred transaction that upgrades
+        # to a writer fails with "database is locked" instead of waiting
+        return super().atomic(lock_type=lock_type)
+
+class MonitoredPostgresqlDatabase(MonitoredDatabaseMixin, PooledPostgresqlDatabase):
+    pass
+
+def create_database(url):
+    scheme = url.split(':', 1)[0].split('+', 1)[0]
+    options = parse(url)
+    pool_options = {
+        'max_connections': DATABASE_MAX_CONNECTIONS,
+        'stale_timeout': DATABASE_STALE_TIMEOUT,
+        'timeout': DATABASE_POOL_TIMEOUT,
+    }
+    
+    if scheme == 'sqlite':
+        return MonitoredSqliteDatabase(pragmas=PRAGMAS, check_same_thread=False, **{**pool_options, **options})
+    if scheme in ('postgres', 'postgresql'):
+        return MonitoredPostgresqlDatabase(**{**pool_options, **options})
+    raise ValueError(f"Unsupported DATABASE_URL scheme: {scheme}")
+
+db = create_database(DATABASE_URL)
+is_postgres = isinstance(db, MonitoredPostgresqlDatabase)
+use_postgis = is_postgres and DATABASE_POSTGIS
+
+@contextmanager
+def connection():
+    opened = db.connect(reuse_if_open=True)
+    try:
+        yield db
+    finally:
+        if opened:
+            db.close()
 
 def initialize_db():
-    from .models import User, Report, ReportHistory, Admin, Review
-    db.connect()
-    db.create_tables([User, Report, ReportHistory, Admin, Review])
-    db.close()
+    from .models import User, Report, ReportHistory, Admin, Review, ReportStats, UserReportStats, AnalysisCache, SchemaVersion
+    from .migrations import run_migrations, mark_all_applied, add_report_geometry
+    with connection():
+        is_new = not db.table_exists(Report._meta.table_name)
+        db.create_tables([User, Report, ReportHistory, Admin, Review, ReportStats, UserReportStats, AnalysisCache, SchemaVersion])
+        if is_new:
+            add_report_geometry(None)
+            mark_all_applied()
+        else:
+            run_migrations()
@@ -0,0 +1,76 @@
+import bisect
+import os
+import threading
+import time
+from .models import User
+
+
+def user_entry(user):
+    return {
+        'telegram_id': user.telegram_id,
+        'username': user.username,
+        'reports_count': user.reports_count,
+        'rating': user.rating
+    }
+
+
+class Leaderboard:
+    def __init__(self, refresh_interval):
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.entries = []
+        self.users = {}
+        self.loaded_at = None
+
+    def reload(self):
+        users = {}
+        query = User.select(User.id, User.telegram_id, User.username, User.reports_count, User.rating)
+        for user in query.iterator():
+            users[user.id] = user_entry(user)
+        entries = sorted((-entry['rating'], user_id) for user_id, entry in users.items())
+
+        with self.lock:
+            self.users = users
+            self.entries = entries
+            self.loaded_at = time.monotonic()
+
+    def ensure_loaded(self):
+        # Users created by the bot process only show up after a refresh
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > self.refresh_interval:
+            self.reload()
+
+    def update(self, user):
+        self.ensure_loaded()
+        with self.lock:
+            old = self.users.get(user.id)
+            if old is not None:
+                index = bisect.bisect_left(self.entries, (-old['rating'], user.id))
+                if index < len(self.entries) and self.entries[index] == (-old['rating'], user.id):
+                    del self.entries[index]
+            self.users[user.id] = user_entry(user)
+            bisect.insort(self.entries, (-user.rating, user.id))
+
+    def rank(self, rating):
+        self.ensure_loaded()
+        with self.lock:
+            return bisect.bisect_left(self.entries, (-rating,)) + 1
+
+    def top(self, limit=10):
+        self.ensure_loaded()
+        with self.lock:
+            return [dict(self.users[user_id]) for _, user_id in self.entries[:limit]]
+
+    def around(self, user, radius=2):
+        self.ensure_loaded()
+        with self.lock:
+            index = bisect.bisect_left(self.entries, (-user.rating, user.id))
+            window = self.entries[max(0, index - radius):index + radius + 1]
+            result = []
+            for neg_rating, user_id in window:
+                entry = dict(self.users[user_id])
+                entry['rank'] = bisect.bisect_left(self.entries, (neg_rating,)) + 1
+                result.append(entry)
+            return result
+
+
+leaderboard = Leaderboard(refresh_interval=int(os.getenv('LEADERBOARD_REFRESH_INTERVAL', 300)))
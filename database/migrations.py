@@ -0,0 +1,74 @@
+import logging
+from playhouse.migrate import SchemaMigrator, migrate
+from .db import db, use_postgis
+from .models import SchemaVersion
+from .rollup import rebuild_rollup
+
+logger = logging.getLogger(__name__)
+
+
+def add_index(migrator, table, columns):
+    name = '_'.join([table] + list(columns))
+    if name not in [index.name for index in db.get_indexes(table)]:
+        migrate(migrator.add_index(table, columns, False))
+
+
+def add_lookup_indexes(migrator):
+    add_index(migrator, 'report', ('status', 'created_at'))
+    add_index(migrator, 'report', ('user_id', 'status'))
+    add_index(migrator, 'report', ('latitude', 'longitude'))
+    add_index(migrator, 'reporthistory', ('report_id', 'created_at'))
+    add_index(migrator, 'reviews', ('is_approved', 'created_at'))
+    add_index(migrator, 'user', ('rating',))
+
+
+def backfill_report_stats(migrator):
+    rebuild_rollup()
+
+
+def add_report_file_id(migrator):
+    from .models import Report
+    if 'telegram_file_id' not in [column.name for column in db.get_columns('report')]:
+        migrate(migrator.add_column('report', 'telegram_file_id', Report.telegram_file_id))
+
+
+def add_report_geometry(migrator):
+    # Generated from latitude/longitude, so the ORM never has to write it
+    if not use_postgis:
+        return
+    db.execute_sql('CREATE EXTENSION IF NOT EXISTS postgis')
+    db.execute_sql(
+        'ALTER TABLE report ADD COLUMN IF NOT EXISTS location geometry(Point, 4326) '
+        'GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)) STORED'
+    )
+    db.execute_sql('CREATE INDEX IF NOT EXISTS report_location ON report USING GIST (location)')
+
+
+MIGRATIONS = [
+    (1, add_lookup_indexes),
+    (2, backfill_report_stats),
+    (3, add_report_geometry),
+    (4, add_report_file_id),
+]
+
+
+def current_version():
+    return SchemaVersion.select(SchemaVersion.version).order_by(SchemaVersion.version.desc()).scalar() or 0
+
+
+def mark_all_applied():
+    for version, _ in MIGRATIONS:
+        SchemaVersion.get_or_create(version=version)
+
+
+def run_migrations():
+    migrator = SchemaMigrator.from_database(db)
+    applied = current_version()
+
+    for version, migration in MIGRATIONS:
+        if version <= applied:
+            continue
+        logger.info("Applying migration %s: %s", version, migration.__name__)
+        with db.atomic():
+            migration(migrator)
+            SchemaVersion.create(version=version)
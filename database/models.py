@@ -1,4 +1,4 @@
-from peewee import Model, IntegerField, CharField, TextField, FloatField, DateTimeField, ForeignKeyField, BooleanField
+from peewee import Model, IntegerField, BigIntegerField, CharField, TextField, FloatField, DateField, DateTimeField, ForeignKeyField, BooleanField
 from datetime import datetime
 from .db import db
 
@@ -7,16 +7,17 @@ class BaseModel(Model):
         database = db
 
 class User(BaseModel):
-    telegram_id = IntegerField(unique=True)
+    telegram_id = BigIntegerField(unique=True)
     username = CharField(null=True)
     first_name = CharField(null=True)
     reports_count = IntegerField(default=0)
-    rating = IntegerField(default=0)
+    rating = IntegerField(default=0, index=True)
     created_at = DateTimeField(default=datetime.now)
 
 class Report(BaseModel):
     user = ForeignKeyField(User, backref='reports')
     photo_path = CharField()
+    telegram_file_id = CharField(null=True)
     latitude = FloatField()
     longitude = FloatField()
     address = CharField(null=True)
@@ -27,16 +28,28 @@ class Report(BaseModel):
     created_at = DateTimeField(default=datetime.now)
     updated_at = DateTimeField(default=datetime.now)
 
+    class Meta:
+        indexes = (
+            (('status', 'created_at'), False),
+            (('user', 'status'), False),
+            (('latitude', 'longitude'), False),
+        )
+
 class ReportHistory(BaseModel):
     report = ForeignKeyField(Report, backref='history')
     old_status = CharField()
     new_status = CharField()
-    changed_by = IntegerField()
+    changed_by = BigIntegerField()
     comment = TextField(null=True)
     created_at = DateTimeField(default=datetime.now)
 
+    class Meta:
+        indexes = (
+            (('report', 'created_at'), False),
+        )
+
 class Admin(BaseModel):
-    telegram_id = IntegerField(unique=True)
+    telegram_id = BigIntegerField(unique=True)
     username = CharField(null=True)
     is_active = BooleanField(default=True)
     created_at = DateTimeField(default=datetime.now)
@@ -50,4 +63,51 @@ class Review(BaseModel):
     created_at = DateTimeField(default=datetime.now)
 
     class Meta:
-        table_name = 'reviews'
\ No newline at end of file
+        table_name = 'reviews'
+        indexes = (
+            (('is_approved', 'created_at'), False),
+        )
+
+
+class ReportStats(BaseModel):
+    status = CharField()
+    waste_type = CharField()
+    danger_level = CharField()
+    day = DateField()
+    count = IntegerField(default=0)
+
+    class Meta:
+        indexes = (
+            (('status', 'waste_type', 'danger_level', 'day'), True),
+        )
+
+
+class UserReportStats(BaseModel):
+    user = ForeignKeyField(User, backref='report_stats', on_delete='CASCADE')
+    status = CharField()
+    count = IntegerField(default=0)
+
+    class Meta:
+        indexes = (
+            (('user', 'status'), True),
+        )
+
+
+class AnalysisCache(BaseModel):
+    image_hash = BigIntegerField()
+    prompt_version = IntegerField()
+    result = TextField()
+    hits = IntegerField(default=0)
+    created_at = DateTimeField(default=datetime.now)
+    last_used_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        indexes = (
+            (('prompt_version', 'image_hash'), False),
+            (('last_used_at',), False),
+        )
+
+
+class SchemaVersion(BaseModel):
+    version = IntegerField(primary_key=True)
+    applied_at = DateTimeField(default=datetime.now)
\ No newline at end of file
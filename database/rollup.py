@@ -0,0 +1,87 @@
+from peewee import chunked, fn
+from .db import db
+from .models import Report, ReportStats, UserReportStats
+
+
+def bump(status, waste_type, danger_level, day, user_id, delta):
+    (ReportStats
+     .insert(status=status, waste_type=waste_type, danger_level=danger_level, day=day, count=delta)
+     .on_conflict(
+         conflict_target=[ReportStats.status, ReportStats.waste_type, ReportStats.danger_level, ReportStats.day],
+         update={ReportStats.count: ReportStats.count + delta})
+     .execute())
+    (UserReportStats
+     .insert(user=user_id, status=status, count=delta)
+     .on_conflict(
+         conflict_target=[UserReportStats.user, UserReportStats.status],
+         update={UserReportStats.count: UserReportStats.count + delta})
+     .execute())
+
+
+def add_report(report, status=None):
+    bump(status or report.status, report.waste_type, report.danger_level,
+         report.created_at.date(), report.user_id, 1)
+
+
+def remove_report(report, status=None):
+    bump(status or report.status, report.waste_type, report.danger_level,
+         report.created_at.date(), report.user_id, -1)
+
+
+def count_reports(statuses=None, excluded=None):
+    query = ReportStats.select(fn.SUM(ReportStats.count))
+    if statuses:
+        query = query.where(ReportStats.status.in_(statuses))
+    if excluded:
+        query = query.where(ReportStats.status.not_in(excluded))
+    return query.scalar() or 0
+
+
+def compute_rollup():
+    buckets = {}
+    users = {}
+    query = Report.select(Report.status, Report.waste_type, Report.danger_level,
+                          Report.created_at, Report.user).tuples()
+    for status, waste_type, danger_level, created_at, user_id in query.iterator():
+        key = (status, waste_type, danger_level, created_at.date())
+        buckets[key] = buckets.get(key, 0) + 1
+        users[(user_id, status)] = users.get((user_id, status), 0) + 1
+    return buckets, users
+
+
+def stored_rollup():
+    buckets = {
+        (s.status, s.waste_type, s.danger_level, s.day): s.count
+        for s in ReportStats.select() if s.count
+    }
+    users = {
+        (s.user_id, s.status): s.count
+        for s in UserReportStats.select() if s.count
+    }
+    return buckets, users
+
+
+def rebuild_rollup():
+    with db.atomic():
+        buckets, users = compute_rollup()
+        ReportStats.delete().execute()
+        UserReportStats.delete().execute()
+        rows = [{'status': k[0], 'waste_type': k[1], 'danger_level': k[2], 'day': k[3], 'count': v}
+                for k, v in buckets.items()]
+        for batch in chunked(rows, 100):
+            ReportStats.insert_many(batch).execute()
+        rows = [{'user': k[0], 'status': k[1], 'count': v} for k, v in users.items()]
+        for batch in chunked(rows, 100):
+            UserReportStats.insert_many(batch).execute()
+    return verify_rollup()
+
+
+def verify_rollup():
+    expected_buckets, expected_users = compute_rollup()
+    actual_buckets, actual_users = stored_rollup()
+    mismatches = []
+    for expected, actual in ((expected_buckets, actual_buckets), (expected_users, actual_users)):
+        for key in expected.keys() | actual.keys():
+            if expected.get(key, 0) != actual.get(key, 0):
+                mismatches.append((key, expected.get(key, 0), actual.get(key, 0)))
+    return mismatches
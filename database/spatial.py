@@ -0,0 +1,98 @@
+import math
+import os
+import threading
+import time
+from .models import Report
+
+EARTH_RADIUS_M = 6371000
+METERS_PER_DEGREE = 111320
+CLOSED_STATUSES = ('resolved', 'rejected')
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class ReportGrid:
+    def __init__(self, cell_size_m, refresh_interval):
+        self.cell_size = cell_size_m / METERS_PER_DEGREE
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.cells = {}
+        self.reports = {}
+        self.loaded_at = None
+
+    def cell(self, latitude, longitude):
+        return int(latitude // self.cell_size), int(longitude // self.cell_size)
+
+    def reload(self):
+        cells = {}
+        reports = {}
+        query = (Report
+                 .select(Report.id, Report.latitude, Report.longitude)
+                 .where(Report.status.not_in(CLOSED_STATUSES)))
+        for report_id, latitude, longitude in query.tuples().iterator():
+            reports[report_id] = (latitude, longitude)
+            cells.setdefault(self.cell(latitude, longitude), set()).add(report_id)
+
+        with self.lock:
+            self.cells = cells
+            self.reports = reports
+            self.loaded_at = time.monotonic()
+
+    def ensure_loaded(self):
+        # Reports changed by another backend process only show up after a refresh
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > self.refresh_interval:
+            self.reload()
+
+    def _discard(self, report_id):
+        old = self.reports.pop(report_id, None)
+        if old is not None:
+            key = self.cell(*old)
+            bucket = self.cells.get(key)
+            if bucket is not None:
+                bucket.discard(report_id)
+                if not bucket:
+                    del self.cells[key]
+
+    def update(self, report):
+        self.ensure_loaded()
+        with self.lock:
+            self._discard(report.id)
+            if report.status not in CLOSED_STATUSES:
+                self.reports[report.id] = (report.latitude, report.longitude)
+                self.cells.setdefault(self.cell(report.latitude, report.longitude), set()).add(report.id)
+
+    def remove(self, report_id):
+        self.ensure_loaded()
+        with self.lock:
+            self._discard(report_id)
+
+    def nearby(self, latitude, longitude, radius_m, limit=5):
+        self.ensure_loaded()
+        lat_span = radius_m / METERS_PER_DEGREE
+        # Longitude degrees shrink towards the poles, so widen the scan accordingly
+        lon_span = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+        min_i, min_j = self.cell(latitude - lat_span, longitude - lon_span)
+        max_i, max_j = self.cell(latitude + lat_span, longitude + lon_span)
+
+        found = []
+        with self.lock:
+            for i in range(min_i, max_i + 1):
+                for j in range(min_j, max_j + 1):
+                    for report_id in self.cells.get((i, j), ()):
+                        report_lat, report_lon = self.reports[report_id]
+                        distance = distance_m(latitude, longitude, report_lat, report_lon)
+                        if distance <= radius_m:
+                            found.append((distance, report_id))
+        found.sort()
+        return found[:limit]
+
+
+report_grid = ReportGrid(
+    cell_size_m=int(os.getenv('REPORT_GRID_CELL_SIZE', 250)),
+    refresh_interval=int(os.getenv('REPORT_GRID_REFRESH_INTERVAL', 300))
+)
@@ -13,6 +13,51 @@ async function fetchReports(filters = {}) {
     return await response.json();
 }
 
+async function fetchReportPoints(filters = {}, bounds = null) {
+    const params = new URLSearchParams();
+    
+    if (filters.status) params.append('status', filters.status);
+    if (filters.waste_type) params.append('waste_type', filters.waste_type);
+    if (filters.danger_level) params.append('danger_level', filters.danger_level);
+    // Yandex bounds are [[minLat, minLon], [maxLat, maxLon]]
+    if (bounds) params.append('bbox', [...bounds[0], ...bounds[1]].join(','));
+    
+    const url = `${API_BASE_URL}/api/reports/points${params.toString() ? '?' + params.toString() : ''}`;
+    
+    const response = await fetch(url);
+    const points = await response.json();
+    
+    // Column arrays keep the payload small; statuses and danger levels come as dictionary codes
+    return {
+        type: 'FeatureCollection',
+        features: points.id.map((id, i) => ({
+            type: 'Feature',
+            id: id,
+            geometry: {
+                type: 'Point',
+                coordinates: [points.lat[i], points.lon[i]]
+            },
+            properties: {
+                id: id,
+                status: points.statuses[points.status[i]],
+                danger_level: points.danger_levels[points.danger[i]]
+            }
+        }))
+    };
+}
+
+function getClustersUrlTemplate(filters = {}) {
+    const params = new URLSearchParams();
+    
+    if (filters.status) params.append('status', filters.status);
+    if (filters.waste_type) params.append('waste_type', filters.waste_type);
+    if (filters.danger_level) params.append('danger_level', filters.danger_level);
+    
+    // %b, %z and %c are filled in by RemoteObjectManager for every tile request
+    const query = params.toString() ? params.toString() + '&' : '';
+    return `${API_BASE_URL}/api/reports/clusters?${query}bbox=%b&z=%z&callback=%c`;
+}
+
 async function fetchReport(reportId) {
     const response = await fetch(`${API_BASE_URL}/api/reports/${reportId}`);
     return await response.json();
@@ -23,6 +68,6 @@ async function fetchStats() {
     return await response.json();
 }
 
-function getPhotoUrl(photoPath) {
-    return `${API_BASE_URL}/uploads/${photoPath}`;
+function getPhotoUrl(photoPath, width) {
+    return `${API_BASE_URL}/uploads/${photoPath}${width ? '?w=' + width : ''}`;
 }
@@ -1,7 +1,28 @@
 let map;
 let objectManager;
+let pointsManager;
+let activeManager;
+let pointsRequest = 0;
 let currentFilters = {};
 
+// Below this zoom a filtered view still uses server cluster tiles; above it the viewport holds few points
+const POINTS_MIN_ZOOM = 13;
+
+const dangerColors = {
+    'Низкий': '#4CAF50',
+    'Средний': '#FF9800',
+    'Высокий': '#F44336',
+    'Критический': '#B71C1C'
+};
+
+const statusIcons = {
+    'new': 'islands#blueCircleIcon',
+    'reviewing': 'islands#orangeCircleIcon',
+    'in_progress': 'islands#violetCircleIcon',
+    'resolved': 'islands#greenCircleIcon',
+    'rejected': 'islands#redCircleIcon'
+};
+
 ymaps.ready(init);
 
 function init() {
@@ -11,71 +32,111 @@ function init() {
         controls: ['zoomControl', 'fullscreenControl']
     });
 
-    objectManager = new ymaps.ObjectManager({
+    // Clusters are computed on the server per zoom; RemoteObjectManager drops the previous zoom's tiles
+    objectManager = new ymaps.RemoteObjectManager(getClustersUrlTemplate(), {
+        splitRequests: true,
+        clusterHasBalloon: false
+    });
+
+    objectManager.clusters.events.add('click', (e) => {
+        const cluster = objectManager.clusters.getById(e.get('objectId'));
+        map.setBounds(cluster.bbox, { checkZoomRange: true, zoomMargin: 40 });
+    });
+
+    // Filtered views at street level are loaded for the visible area from the compact points feed
+    pointsManager = new ymaps.ObjectManager({
         clusterize: true,
-        gridSize: 64,
-        clusterIconLayout: 'default#pieChart',
-        clusterDisableClickZoom: false
+        gridSize: 64
     });
 
-    map.geoObjects.add(objectManager);
+    setupReportEvents(objectManager);
+    setupReportEvents(pointsManager);
+
+    showManager(objectManager);
+
+    map.events.add('boundschange', () => {
+        if (hasFilters(currentFilters)) loadReports(currentFilters);
+    });
 
-    loadReports();
     setupEventListeners();
 }
 
+function setupReportEvents(manager) {
+    manager.objects.events.add('add', (e) => {
+        decorateReport(manager, manager.objects.getById(e.get('objectId')));
+    });
+
+    // Markers carry only id, status and danger; the balloon text is fetched on open
+    manager.objects.events.add('balloonopen', (e) => {
+        loadBalloon(manager, e.get('objectId'));
+    });
+}
+
+function showManager(manager) {
+    if (activeManager === manager) return;
+    if (activeManager) map.geoObjects.remove(activeManager);
+    map.geoObjects.add(manager);
+    activeManager = manager;
+}
+
+function hasFilters(filters) {
+    return Boolean(filters.status || filters.waste_type || filters.danger_level);
+}
+
 async function loadReports(filters = {}) {
-    const reports = await fetchReports(filters);
-    displayReportsOnMap(reports);
+    const request = ++pointsRequest;
+
+    if (!hasFilters(filters) || map.getZoom() < POINTS_MIN_ZOOM) {
+        const template = getClustersUrlTemplate(filters);
+        showManager(objectManager);
+        if (objectManager.getUrlTemplate() !== template) {
+            objectManager.setUrlTemplate(template);
+            objectManager.reloadData();
+        }
+        return;
+    }
+
+    const points = await fetchReportPoints(filters, map.getBounds());
+    // A newer pan or filter change has already been requested
+    if (request !== pointsRequest) return;
+    pointsManager.removeAll();
+    pointsManager.add(points);
+    showManager(pointsManager);
 }
 
-function displayReportsOnMap(reports) {
-    const dangerColors = {
-        'Низкий': '#4CAF50',
-        'Средний': '#FF9800',
-        'Высокий': '#F44336',
-        'Критический': '#B71C1C'
-    };
+function decorateReport(manager, report) {
+    const props = report.properties;
 
-    const statusIcons = {
-        'new': 'islands#blueCircleIcon',
-        'reviewing': 'islands#orangeCircleIcon',
-        'in_progress': 'islands#violetCircleIcon',
-        'resolved': 'islands#greenCircleIcon',
-        'rejected': 'islands#redCircleIcon'
-    };
+    Object.assign(props, {
+        balloonContentHeader: `<strong>${props.waste_type || 'Отчёт #' + props.id}</strong>`,
+        balloonContentBody: 'Загрузка...',
+        iconContent: props.id,
+        hintContent: props.waste_type ? `${props.waste_type} - ${props.danger_level}` : props.danger_level
+    });
 
-    const features = reports.map(report => {
-        return {
-            type: 'Feature',
-            id: report.id,
-            geometry: {
-                type: 'Point',
-                coordinates: [report.latitude, report.longitude]
-            },
-            properties: {
-                balloonContentHeader: `<strong>${report.waste_type}</strong>`,
-                balloonContentBody: `
-                    <p><strong>Уровень опасности:</strong> <span style="color: ${dangerColors[report.danger_level]}">${report.danger_level}</span></p>
-                    <p><strong>Статус:</strong> ${getStatusName(report.status)}</p>
-                    <p><strong>Описание:</strong> ${report.description}</p>
-                    <p><a href="#" onclick="showReportCard(${report.id}); return false;">Подробнее</a></p>
-                `,
-                balloonContentFooter: `Дата: ${new Date(report.created_at).toLocaleDateString('ru-RU')}`,
-                iconContent: report.id,
-                hintContent: `${report.waste_type} - ${report.danger_level}`
-            },
-            options: {
-                preset: statusIcons[report.status] || 'islands#blueCircleIcon'
-            }
-        };
+    manager.objects.setObjectOptions(report.id, {
+        preset: statusIcons[props.status] || 'islands#blueCircleIcon'
     });
+}
+
+async function loadBalloon(manager, reportId) {
+    const object = manager.objects.getById(reportId);
+    if (!object || object.properties.balloonLoaded) return;
+
+    const report = await fetchReport(reportId);
 
-    objectManager.removeAll();
-    objectManager.add({
-        type: 'FeatureCollection',
-        features: features
+    Object.assign(object.properties, {
+        balloonLoaded: true,
+        balloonContentHeader: `<strong>${report.waste_type}</strong>`,
+        balloonContentBody: `
+            <p><strong>Уровень опасности:</strong> <span style="color: ${dangerColors[report.danger_level]}">${report.danger_level}</span></p>
+            <p><strong>Статус:</strong> ${getStatusName(report.status)}</p>
+            <p><strong>Описание:</strong> ${report.description}</p>
+            <p><a href="#" onclick="showReportCard(${report.id}); return false;">Подробнее</a></p>
+        `,
+        balloonContentFooter: `Дата: ${new Date(report.created_at).toLocaleDateString('ru-RU')}`
     });
+    manager.objects.balloon.setData(object);
 }
 
 async function showReportCard(reportId) {
@@ -90,7 +151,7 @@ async function showReportCard(reportId) {
     };
 
     const cardContent = `
-        <img src="${getPhotoUrl(report.photo_path)}" alt="Фото загрязнения">
+        <img src="${getPhotoUrl(report.photo_path, 640)}" srcset="${getPhotoUrl(report.photo_path, 640)} 1x, ${getPhotoUrl(report.photo_path, 1280)} 2x" alt="Фото загрязнения">
         <h3>Отчёт #${report.id} 
             <span class="status-badge status-${report.status}">${statusNames[report.status]}</span>
         </h3>
@@ -0,0 +1,69 @@
+import os
+import tempfile
+
+import pytest
+
+# Configuration is read at import time, so it has to be in place before the app is imported
+TEST_DIR = tempfile.mkdtemp(prefix='eco-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ['UPLOAD_STORAGE'] = 'local'
+os.environ['UPLOADS_DIR'] = os.path.join(TEST_DIR, 'uploads')
+os.environ.setdefault('GIGACHAT_API_TOKEN', 'test')
+
+from backend.app import app as flask_app
+from backend.routes.stats import invalidate_stats
+from database import connection, initialize_db, User, Report, ReportHistory, Admin, Review, ReportStats, UserReportStats, AnalysisCache
+from database.clusters import report_clusters
+from database.leaderboard import leaderboard
+from database.spatial import report_grid
+
+# Children first, so rows can be deleted without tripping foreign keys
+MODELS = [ReportHistory, Review, UserReportStats, Report, User, Admin, ReportStats, AnalysisCache]
+
+
+def clear_db():
+    with connection():
+        for model in MODELS:
+            model.delete().execute()
+    reset_caches()
+
+
+def reset_caches():
+    report_grid.loaded_at = None
+    leaderboard.loaded_at = None
+    report_clusters.invalidate()
+    invalidate_stats()
+
+
+@pytest.fixture(scope='session')
+def app():
+    initialize_db()
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(autouse=True)
+def clean_db(app):
+    yield
+    clear_db()
+
+
+def create_user(telegram_id, **fields):
+    return User.create(telegram_id=telegram_id, username=f"user{telegram_id}", **fields)
+
+
+def create_report(user, **fields):
+    values = {
+        'photo_path': 'test.jpg',
+        'latitude': 61.24,
+        'longitude': 73.39,
+        'description': 'Мусор у дороги',
+        'waste_type': 'Пластик',
+        'danger_level': 'Низкий',
+    }
+    values.update(fields)
+    return Report.create(user=user, **values)
@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.services import gigachat_service
+from bot.utils import analysis
+
+LATENCY = 0.3
+VERDICT = {'is_pollution': False, 'message': 'На фото нет экологических загрязнений'}
+
+
+@pytest.fixture
+def stub_gigachat(monkeypatch):
+    calls = []
+
+    def request_analysis(image):
+        calls.append(image)
+        time.sleep(LATENCY)
+        return dict(VERDICT)
+
+    # Non-image bytes have no dhash, so the analysis cache is bypassed as well
+    monkeypatch.setattr(gigachat_service, '_request_analysis', request_analysis)
+    return calls
+
+
+def submit_all(images):
+    async def run():
+        return await asyncio.gather(*[
+            analysis.analyze_image(image, user_id) for user_id, image in images
+        ])
+
+    started = time.perf_counter()
+    results = asyncio.run(run())
+    return results, time.perf_counter() - started
+
+
+def test_concurrent_users_finish_in_about_one_latency(stub_gigachat):
+    users = gigachat_service._pool._max_workers
+    images = [(user_id, f"photo-{user_id}".encode()) for user_id in range(users)]
+
+    results, elapsed = submit_all(images)
+
+    assert results == [VERDICT] * users
+    assert len(stub_gigachat) == users
+    # Sequential handling would take users * LATENCY; concurrent handling is one latency plus the batch window
+    assert elapsed < analysis.ANALYSIS_BATCH_WINDOW + LATENCY * 1.5
+
+
+def test_one_user_is_analysed_in_order(stub_gigachat):
+    images = [(1, f"photo-{i}".encode()) for i in range(analysis.ANALYSIS_USER_QUEUE_LIMIT)]
+
+    results, elapsed = submit_all(images)
+
+    assert results == [VERDICT] * len(images)
+    assert stub_gigachat == [image for _, image in images]
+    assert elapsed >= LATENCY * len(images)
+
+
+def test_user_queue_limit(stub_gigachat):
+    images = [(1, f"photo-{i}".encode()) for i in range(analysis.ANALYSIS_USER_QUEUE_LIMIT + 1)]
+
+    async def run():
+        return await asyncio.gather(*[
+            analysis.analyze_image(image, user_id) for user_id, image in images
+        ], return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert isinstance(results[-1], analysis.AnalysisQueueFull)
+    assert results[:-1] == [VERDICT] * analysis.ANALYSIS_USER_QUEUE_LIMIT
+
+
+def test_batched_throughput(stub_gigachat):
+    distinct = 6
+    images = [(user_id, f"photo-{user_id % distinct}".encode()) for user_id in range(distinct * 2)]
+
+    started = time.perf_counter()
+    for _, image in images[:distinct]:
+        gigachat_service._request_analysis(image)
+    sequential = time.perf_counter() - started
+    stub_gigachat.clear()
+
+    results, batched = submit_all(images)
+
+    assert results == [VERDICT] * len(images)
+    # Duplicate files in a batch are analysed once
+    assert len(stub_gigachat) == distinct
+    # Twice the submissions still finish well ahead of the distinct files run one by one
+    assert len(images) / batched > 2 * distinct / sequential
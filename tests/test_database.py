@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+from database import db, rollup, Report, ReportHistory
+from database.db import create_database
+from conftest import MODELS, reset_caches
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+REPORT = {
+    'user_id': 501,
+    'username': 'tester',
+    'photo_path': 'ab/cd/abcd.jpg',
+    'latitude': 61.2418,
+    'longitude': 73.3930,
+    'description': 'Свалка у гаражей',
+    'waste_type': 'Смешанные',
+    'danger_level': 'Высокий',
+}
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def engine(request):
+    if request.param == 'sqlite':
+        yield db
+        return
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL is not set')
+
+    # Models are rebound to the Postgres database for the duration of the test
+    database = create_database(TEST_DATABASE_URL)
+    with database.bind_ctx(MODELS):
+        database.create_tables(MODELS)
+        reset_caches()
+        try:
+            yield database
+        finally:
+            database.drop_tables(MODELS)
+            reset_caches()
+    database.close_all()
+
+
+def create(client, **fields):
+    response = client.post('/api/reports', json={**REPORT, **fields})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def test_create_and_fetch_report(engine, client):
+    report_id = create(client)
+
+    report = client.get(f'/api/reports/{report_id}').get_json()
+    assert report['user_id'] == REPORT['user_id']
+    assert report['status'] == 'new'
+    assert report['history'] == []
+    assert [r['id'] for r in client.get('/api/reports').get_json()] == [report_id]
+
+
+def test_status_change_keeps_rollup_consistent(engine, client):
+    report_id = create(client)
+
+    response = client.put(f'/api/reports/{report_id}', json={'status': 'in_progress', 'changed_by': 1})
+    assert response.status_code == 200
+
+    report = client.get(f'/api/reports/{report_id}').get_json()
+    assert report['status'] == 'in_progress'
+    assert [h['new_status'] for h in report['history']] == ['in_progress']
+    assert rollup.verify_rollup() == []
+
+
+def test_nearby_and_attach(engine, client):
+    report_id = create(client)
+
+    nearby = client.get('/api/reports/nearby', query_string={'lat': 61.2419, 'lon': 73.3931}).get_json()
+    assert [r['id'] for r in nearby] == [report_id]
+
+    response = client.post(f'/api/reports/{report_id}/attach', json={'user_id': 502})
+    assert response.status_code == 201
+    assert ReportHistory.select().where(ReportHistory.report == report_id).count() == 1
+
+
+def test_delete_report_with_history(engine, client):
+    report_id = create(client)
+    client.put(f'/api/reports/{report_id}', json={'status': 'reviewing', 'changed_by': 1})
+    client.post(f'/api/reports/{report_id}/attach', json={'user_id': 502})
+
+    # Postgres enforces the report -> history foreign key, so the history must go first
+    response = client.delete(f'/api/reports/{report_id}')
+    assert response.status_code == 200
+
+    assert not Report.select().where(Report.id == report_id).exists()
+    assert not ReportHistory.select().where(ReportHistory.report == report_id).exists()
+    assert rollup.verify_rollup() == []
+    assert client.get('/api/reports/nearby', query_string={'lat': 61.2419, 'lon': 73.3931}).get_json() == []
+
+
+def test_attach_requires_user(engine, client):
+    report_id = create(client)
+
+    assert client.post(f'/api/reports/{report_id}/attach', json={}).status_code == 400
+    assert client.post(f'/api/reports/{report_id}/attach').status_code == 400
+    assert client.post('/api/reports/999/attach', json={'user_id': 502}).status_code == 404
+
+
+def test_telegram_file_id_only_on_request(engine, client):
+    report_id = create(client, telegram_file_id='AgACAgIAAxk')
+
+    assert 'telegram_file_id' not in client.get('/api/reports').get_json()[0]
+    assert 'telegram_file_id' not in client.get(f'/api/reports/{report_id}').get_json()
+    report = client.get(f'/api/reports/{report_id}', query_string={'fields': 'id,telegram_file_id'}).get_json()
+    assert report == {'id': report_id, 'telegram_file_id': 'AgACAgIAAxk'}
@@ -0,0 +1,14 @@
+from database import db, connection
+
+
+def test_pooled_checkouts_are_counted(app):
+    db.close()
+    before = db.get_metrics()['checkouts']
+
+    for _ in range(5):
+        with connection():
+            db.execute_sql('SELECT 1')
+
+    metrics = db.get_metrics()
+    assert metrics['checkouts'] - before == 5
+    assert 'lock_waits' not in metrics and 'slow_statements' in metrics
@@ -0,0 +1,26 @@
+import io
+import struct
+
+from PIL import Image
+
+from bot.utils.exif import extract_gps_from_image
+
+
+def jpeg_with_gps():
+    exif = Image.Exif()
+    exif.get_ifd(0x8825).update({1: 'N', 2: (55.0, 45.0, 0.0), 3: 'E', 4: (37.0, 37.0, 0.0)})
+    output = io.BytesIO()
+    Image.new('RGB', (64, 64)).save(output, 'JPEG', exif=exif.tobytes())
+    return output.getvalue()
+
+
+def test_gps_from_jpeg_bytes():
+    assert extract_gps_from_image(jpeg_with_gps(), 'photo') == {'latitude': 55.75, 'longitude': 37.61666666666667}
+
+
+def test_gps_after_a_large_leading_segment():
+    # A near-64 KB segment before APP1, e.g. a JFIF thumbnail, pushes EXIF past the first 64 KB
+    data = jpeg_with_gps()
+    padding = b'\x00' * 65500
+    data = data[:2] + b'\xff\xe2' + struct.pack('>H', len(padding) + 2) + padding + data[2:]
+    assert extract_gps_from_image(data, 'photo') == {'latitude': 55.75, 'longitude': 37.61666666666667}
@@ -0,0 +1,14 @@
+from database import connection
+from conftest import create_user
+
+
+def test_leaderboard_bounds(client):
+    with connection():
+        for i in range(8):
+            create_user(100 + i, rating=i)
+
+    assert len(client.get('/api/leaderboard', query_string={'limit': -5}).get_json()) == 1
+    assert len(client.get('/api/leaderboard', query_string={'limit': 500}).get_json()) == 8
+
+    around = client.get('/api/user/104/leaderboard', query_string={'radius': -3}).get_json()
+    assert [u['telegram_id'] for u in around['users']] == [104]
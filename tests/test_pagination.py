@@ -0,0 +1,59 @@
+from bot.handlers.admin import ITEMS_PER_PAGE, parse_page_callback, users_list
+from database import connection, User
+from conftest import create_user, create_report
+
+
+def test_unknown_anchor_is_gone(client):
+    with connection():
+        create_report(create_user(1))
+
+    response = client.get('/api/reports', query_string={'after_id': 999, 'limit': 10})
+    assert response.status_code == 410
+
+
+def test_unknown_anchor_falls_back_to_cursor(client):
+    with connection():
+        user = create_user(1)
+        for _ in range(3):
+            create_report(user)
+
+    first = client.get('/api/reports', query_string={'limit': 1})
+    cursor = first.headers['X-Next-Cursor']
+    expected = client.get('/api/reports', query_string={'limit': 1, 'cursor': cursor}).get_json()
+
+    response = client.get('/api/reports', query_string={'limit': 1, 'cursor': cursor, 'after_id': 999})
+    assert response.status_code == 200
+    assert response.get_json() == expected
+
+
+def next_page(keyboard):
+    for button in keyboard.inline_keyboard[-2]:
+        if button.callback_data.startswith('user_page_') and button.text.startswith('Вперёд'):
+            return parse_page_callback(button.callback_data)
+
+
+def test_users_page_boundary_survives_rating_change():
+    with connection():
+        users = [create_user(100 + i, rating=i) for i in range(ITEMS_PER_PAGE * 2)]
+
+    _, _, keyboard, _ = users_list()
+    page, direction, anchor_id, anchor_value = next_page(keyboard)
+    assert (page, direction) == (1, 'a')
+
+    # The last user on page 1 climbs to the top before the admin clicks "next"
+    with connection():
+        User.update(rating=1000).where(User.id == anchor_id).execute()
+
+    _, _, keyboard, page = users_list(page, direction, anchor_id, anchor_value)
+    shown = [int(row[0].callback_data.split('_')[1]) for row in keyboard.inline_keyboard[:-2]]
+    assert page == 1
+    assert shown == [u.id for u in reversed(users[:ITEMS_PER_PAGE])]
+
+
+def test_users_unknown_anchor_resets_page():
+    with connection():
+        for i in range(3):
+            create_user(100 + i, rating=i)
+
+    _, _, _, page = users_list(4, 'a', 99999)
+    assert page == 0
@@ -0,0 +1,51 @@
+import pytest
+
+from database import db, connection, Review
+from conftest import clear_db, create_user, create_report
+
+
+@pytest.fixture
+def count_queries(monkeypatch):
+    execute_sql = db.execute_sql
+    counter = {'queries': 0}
+
+    def counting_execute_sql(sql, params=None, *args, **kwargs):
+        counter['queries'] += 1
+        return execute_sql(sql, params, *args, **kwargs)
+
+    monkeypatch.setattr(db, 'execute_sql', counting_execute_sql)
+
+    def run(client, url):
+        counter['queries'] = 0
+        response = client.get(url)
+        assert response.status_code == 200
+        return counter['queries']
+
+    return run
+
+
+def populate(rows):
+    with connection():
+        first = None
+        for i in range(rows):
+            user = create_user(1000 + i)
+            report = create_report(user, latitude=61.24 + i * 0.001)
+            Review.create(user=user, text=f"Отзыв {i}")
+            first = first or report
+    return first
+
+
+def measure(client, count_queries, rows):
+    report = populate(rows)
+    return {
+        'reports': count_queries(client, '/api/reports'),
+        'report': count_queries(client, f'/api/reports/{report.id}'),
+        'reviews': count_queries(client, '/api/reviews'),
+    }
+
+
+def test_listing_query_count_does_not_grow_with_rows(client, count_queries):
+    single = measure(client, count_queries, 1)
+    clear_db()
+    many = measure(client, count_queries, 50)
+    assert single == many
@@ -0,0 +1,181 @@
+import io
+import threading
+import types
+
+import pytest
+from PIL import Image
+
+from backend.services.derivatives import DerivativeService, derivative_name
+from backend.services.storage import LocalStorage, S3Storage, content_key
+
+
+class ClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}}
+
+
+class StubS3Client:
+    # The subset of the boto3 S3 client that S3Storage uses, backed by a dict
+    exceptions = types.SimpleNamespace(ClientError=ClientError)
+
+    def __init__(self):
+        self.objects = {}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError('404')
+        return {}
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError('NoSuchKey')
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)][0])}
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.objects[(Bucket, Key)] = (Body, ContentType)
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def generate_presigned_url(self, method, Params, ExpiresIn):
+        return f"https://s3.test/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+
+def jpeg(color='green', size=(800, 600)):
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, 'JPEG')
+    return output.getvalue()
+
+
+@pytest.fixture(params=['local', 's3'])
+def storage(request, tmp_path):
+    if request.param == 'local':
+        return LocalStorage(tmp_path)
+    return S3Storage('photos', prefix='uploads', client=StubS3Client())
+
+
+def test_content_key_is_sharded():
+    key = content_key(jpeg())
+    shard1, shard2, name = key.split('/')
+    assert name.startswith(shard1 + shard2)
+    assert name.endswith('.jpg') and len(name) == 64 + 4
+
+
+@pytest.mark.parametrize('image_format, ext', [('JPEG', 'jpg'), ('PNG', 'png'), ('WEBP', 'webp'), ('GIF', 'gif')])
+def test_content_key_extension_follows_the_bytes(image_format, ext):
+    output = io.BytesIO()
+    Image.new('RGB', (8, 8)).save(output, image_format)
+    assert content_key(output.getvalue()).endswith('.' + ext)
+    assert content_key(b'not an image').endswith('.bin')
+
+
+def test_save_deduplicates(storage):
+    data = jpeg()
+    key = storage.save(data)
+
+    assert storage.save(data) == key
+    assert storage.save(jpeg('red')) != key
+    assert storage.read(key) == data
+
+
+def test_missing_and_delete(storage):
+    key = storage.save(b'photo')
+    storage.delete(key)
+
+    assert not storage.exists(key)
+    with pytest.raises(FileNotFoundError):
+        storage.read(key)
+
+
+def test_traversal_is_rejected(storage):
+    with pytest.raises(FileNotFoundError):
+        storage.read('../secret.jpg')
+
+
+def test_derivatives_are_written_next_to_the_original(storage):
+    key = storage.save(jpeg())
+    DerivativeService(storage, workers=1, max_pending=4).generate(key)
+
+    for width in (320, 640, 1280):
+        for ext in ('jpg', 'webp'):
+            assert storage.exists(derivative_name(key, width, ext))
+
+
+def test_s3_objects_use_prefix_and_content_type():
+    client = StubS3Client()
+    storage = S3Storage('photos', prefix='/uploads/', client=client)
+    key = storage.save(jpeg())
+    png = io.BytesIO()
+    Image.new('RGB', (8, 8)).save(png, 'PNG')
+    png_key = storage.save(png.getvalue())
+    DerivativeService(storage, workers=1, max_pending=4).render(key, 320, 'webp')
+
+    assert client.objects[('photos', f'uploads/{key}')][1] == 'image/jpeg'
+    assert client.objects[('photos', f"uploads/{derivative_name(key, 320, 'webp')}")][1] == 'image/webp'
+    assert client.objects[('photos', f'uploads/{png_key}')][1] == 'image/png'
+    assert storage.url(key).startswith(f'https://s3.test/photos/uploads/{key}')
+
+
+def test_concurrent_writes_of_one_key(tmp_path):
+    storage = LocalStorage(tmp_path)
+    key = content_key(b'photo')
+    errors = []
+
+    def write():
+        try:
+            for _ in range(50):
+                storage.write(key, b'photo')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert storage.read(key) == b'photo'
+    assert not [path for path in tmp_path.rglob('*.tmp')]
+
+
+def test_on_demand_widths_are_queued_not_rendered_inline(client, monkeypatch):
+    from backend.services.derivatives import derivative_service
+    from backend.services.storage import storage
+
+    key = storage.save(jpeg())
+    futures = []
+    monkeypatch.setattr(derivative_service, 'request', lambda k: futures.append(derivative_service.submit(k)))
+
+    response = client.get(f'/uploads/{key}?w=300')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert 'immutable' not in response.headers['Cache-Control']
+    futures[0].result()
+
+    response = client.get(f'/uploads/{key}?w=300', headers={'Accept': 'image/webp'})
+    assert response.mimetype == 'image/webp'
+    assert 'immutable' in response.headers['Cache-Control']
+
+    assert client.get(f"/uploads/{derivative_name(key, 320, 'jpg')}?w=320").status_code == 404
+    assert client.get('/uploads/../app.py?w=320').status_code == 404
+    assert client.get('/uploads/00/00/missing.jpg?w=320').status_code == 404
+
+
+def test_on_demand_queue_is_deduplicated_and_bounded(tmp_path):
+    storage = LocalStorage(tmp_path)
+    service = DerivativeService(storage, workers=1, max_pending=2)
+    gate = threading.Event()
+    service.generate = lambda key, data=None: gate.wait()
+
+    first = service.request('a.jpg')
+    assert service.request('a.jpg') is None
+    assert service.request('b.jpg') is not None
+    assert service.request('c.jpg') is None
+    # Ingest is never dropped by the on-demand bound
+    assert service.submit('d.jpg') is not None
+
+    gate.set()
+    first.result()
+    service.close()
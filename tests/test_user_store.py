@@ -0,0 +1,50 @@
+import asyncio
+import types
+
+from bot.middlewares.user_middleware import UserStore
+from database import connection, User
+
+
+def telegram_user(user_id, username='tester', first_name='Test'):
+    return types.SimpleNamespace(id=user_id, username=username, first_name=first_name)
+
+
+def test_new_user_is_persisted_immediately(client):
+    store = UserStore(max_size=10, flush_interval=60)
+
+    db_user = asyncio.run(store.get(telegram_user(42)))
+
+    assert db_user.id is not None
+    assert not store.dirty
+    assert client.get('/api/user/42/stats').status_code == 200
+
+
+def test_name_changes_are_written_behind():
+    store = UserStore(max_size=10, flush_interval=60)
+
+    async def run():
+        await store.get(telegram_user(42))
+        await store.get(telegram_user(42, username='renamed'))
+        assert User.get(User.telegram_id == 42).username == 'tester'
+        await store.flush()
+
+    asyncio.run(run())
+    with connection():
+        assert User.get(User.telegram_id == 42).username == 'renamed'
+
+
+def test_counters_are_not_cached_or_overwritten():
+    store = UserStore(max_size=10, flush_interval=60)
+
+    async def run():
+        cached = await store.get(telegram_user(42))
+        # The backend credits a report while the user sits in the LRU
+        User.update(rating=User.rating + 10, reports_count=User.reports_count + 1).where(User.telegram_id == 42).execute()
+        assert cached.rating is None
+        await store.get(telegram_user(42, username='renamed'))
+        await store.flush()
+
+    asyncio.run(run())
+    with connection():
+        user = User.get(User.telegram_id == 42)
+    assert (user.username, user.rating, user.reports_count) == ('renamed', 10, 1)